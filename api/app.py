@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, ValidationError
+
+# Add the root directory (where 'services' is located) to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.document_processor import DocumentProcessor
+from services.job_queue import JobQueue, QueueFullError, EXTRACT_JOB, COMPARE_JOB
+from utils.constants import ApiConstants
+
+
+class CompareRequest(BaseModel):
+    """Two extraction payloads to compare, as returned by an extraction job."""
+    doc1: dict
+    doc2: dict
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    processor = DocumentProcessor()
+    app.state.processor = processor
+    job_queue = JobQueue(
+        processor,
+        db_path=ApiConstants.JOB_DB_PATH,
+        workers=ApiConstants.WORKERS,
+        max_queue_size=ApiConstants.MAX_QUEUE_SIZE,
+        retention_seconds=ApiConstants.JOB_RETENTION_SECONDS,
+        purge_interval=ApiConstants.PURGE_INTERVAL_SECONDS,
+    )
+    await job_queue.start()
+    app.state.job_queue = job_queue
+    try:
+        yield
+    finally:
+        await job_queue.stop()
+        processor.close()
+
+
+app = FastAPI(title="Rent Agreement Extraction API", lifespan=lifespan)
+
+TOO_LARGE = "The uploaded document is too large."
+UPLOAD_PATHS = ("/jobs/extract", "/jobs/compare")
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads whose declared Content-Length is over the limit before the body is read."""
+    length = request.headers.get("content-length", "")
+    limit = ApiConstants.MAX_UPLOAD_BYTES + ApiConstants.MULTIPART_OVERHEAD_BYTES
+    if request.url.path.startswith(UPLOAD_PATHS) and length.isdigit() and int(length) > limit:
+        return JSONResponse(status_code=413, content={"detail": TOO_LARGE})
+    return await call_next(request)
+
+
+async def _submit(request: Request, kind: str, payload: bytes, filename: str = None) -> dict:
+    """Queue a job, translating backpressure into HTTP 429."""
+    try:
+        job_id = await request.app.state.job_queue.submit(kind, payload, filename)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(ApiConstants.RETRY_AFTER_SECONDS)})
+    return {"job_id": job_id, "status": "queued"}
+
+
+def _check_filename(filename: str):
+    if not filename.lower().endswith((".pdf", ".docx")):
+        raise HTTPException(status_code=415, detail="Only .pdf and .docx documents are supported.")
+
+
+async def _read_upload(chunks: AsyncIterator[bytes]) -> bytes:
+    """Read an upload chunk by chunk, refusing it as soon as it exceeds the size limit."""
+    payload = bytearray()
+    async for chunk in chunks:
+        payload += chunk
+        if len(payload) > ApiConstants.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=TOO_LARGE)
+    if not payload:
+        raise HTTPException(status_code=400, detail="The uploaded document is empty.")
+    return bytes(payload)
+
+
+async def _file_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(ApiConstants.UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+
+@app.post("/jobs/extract", status_code=202)
+async def submit_extraction(request: Request, file: UploadFile = File(...)):
+    """Submit an extraction job for an uploaded PDF or DOCX file."""
+    filename = file.filename or "document.pdf"
+    _check_filename(filename)
+    payload = await _read_upload(_file_chunks(file))
+    return await _submit(request, EXTRACT_JOB, payload, filename)
+
+
+@app.post("/jobs/extract/raw", status_code=202)
+async def submit_raw_extraction(request: Request, filename: str = Query("document.pdf")):
+    """Submit an extraction job with the document bytes as the request body."""
+    _check_filename(filename)
+    payload = await _read_upload(request.stream())
+    return await _submit(request, EXTRACT_JOB, payload, filename)
+
+
+@app.post("/jobs/compare", status_code=202)
+async def submit_comparison(request: Request):
+    """Submit a comparison job for two extraction results, given as a CompareRequest JSON body."""
+    # The body is read with the same size limit as uploads rather than parsed by FastAPI.
+    try:
+        body = CompareRequest.model_validate_json(await _read_upload(request.stream()))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    payload = json.dumps({"doc1": body.doc1, "doc2": body.doc2}).encode("utf-8")
+    return await _submit(request, COMPARE_JOB, payload)
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(request: Request, job_id: str, wait: float = Query(0, ge=0, le=ApiConstants.MAX_WAIT_SECONDS)):
+    """Return a job's status; with ``wait`` > 0, long-poll until it finishes or the wait expires."""
+    job = await request.app.state.job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    job.pop("result")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(request: Request, job_id: str):
+    """Return a finished job's result, or its error if it failed."""
+    job = await request.app.state.job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=422, detail=job["error"])
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    return {"job_id": job_id, "kind": job["kind"], "result": job["result"]}
+
+
+@app.get("/health")
+async def health(request: Request):
+    """Liveness probe with queue depth and scratch disk usage."""
+    return {
+        "status": "ok",
+        **request.app.state.job_queue.stats(),
+        "workspace": request.app.state.processor.workspace_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Stage timings, token usage and payload sizes in the Prometheus text format."""
+    return request.app.state.processor.telemetry.prometheus_text()
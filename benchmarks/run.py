@@ -0,0 +1,365 @@
+"""End-to-end benchmarks for DocumentProcessor against a local OpenAI stub.
+
+Usage (from the repository root):
+    python -m benchmarks.run --pages 1,10,50 --concurrency 1,4,8 --output bench.json
+
+Results are written as JSON so runs of different versions can be diffed.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.stub_server import AGREEMENT, StubOpenAIServer
+from benchmarks.synthetic import extracted_agreement, generate_docx, generate_pdf
+from services.batch import BatchRunner
+from services.document_processor import DocumentProcessor
+from services.docx_reader import DocxConverter
+from services.payload import RequestBody
+from services.portfolio import PortfolioIndex
+from utils.cache import ResultCache
+from utils.prompts import RentalAgreement
+from utils.telemetry import InMemorySink, Telemetry
+
+
+def percentiles(samples: List[float]) -> dict:
+    """Summarize latency samples (seconds) as milliseconds percentiles."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> dict:
+    """Return the peak resident set size of this process and its reaped children, in MB."""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def rss_mb(field: str) -> Optional[float]:
+    """Read a memory field (e.g. VmRSS or VmHWM) of this process from /proc, in MB."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(f"{field}:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter of this process, where supported (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+async def measure_memory(coroutine_factory: Callable) -> dict:
+    """Run one call and report its peak traced Python allocations and the process's peak RSS.
+
+    The RSS peak is only specific to the call where it can be reset; otherwise it
+    is the peak of the whole process so far (``ru_maxrss``).
+    """
+    gc.collect()
+    per_call = reset_peak_rss()
+    rss_before = rss_mb("VmRSS")
+    tracemalloc.start()
+    try:
+        await coroutine_factory()
+        _, python_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss_peak = rss_mb("VmHWM") if per_call else peak_rss_mb()["self"]
+    return {
+        "python_peak_mb": round(python_peak / (1024 * 1024), 1),
+        "rss_peak_mb": rss_peak,
+        "rss_growth_mb": round(rss_peak - rss_before, 1) if per_call and rss_before is not None else None,
+        "rss_peak_per_call": per_call,
+    }
+
+
+async def timed(samples: List[float], coroutine_factory: Callable):
+    started = time.perf_counter()
+    result = await coroutine_factory()
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def make_processor() -> DocumentProcessor:
+    processor = DocumentProcessor(telemetry=Telemetry([InMemorySink()]))
+    # Benchmarks measure the pipeline, not the result cache or template reuse.
+    processor.extraction_cache = ResultCache(max_entries=0)
+    processor.template_index = None
+    return processor
+
+
+async def bench_document(processor, data: bytes, iterations: int) -> dict:
+    """Time each extraction stage of one document, plus the full call."""
+    stages = {"render": [], "build_payload": [], "api": [], "end_to_end": [], "stream_first_field": [], "stream_end_to_end": []}
+    payload_bytes = 0
+    for _ in range(iterations):
+        pages = await timed(stages["render"], lambda: processor._extract_from_binary(data))
+
+        started = time.perf_counter()
+        page_text, images = processor._join_pages(pages)
+        messages = processor._prepare_extraction_messages(images, page_text)
+        payload_bytes = RequestBody({"messages": messages}).size
+        stages["build_payload"].append(time.perf_counter() - started)
+
+        await timed(stages["api"], lambda: processor._get_openai_response(messages, RentalAgreement))
+        await timed(stages["end_to_end"], lambda: processor.extract_text_and_images(pdf_data=data))
+
+        started = time.perf_counter()
+        first_field = None
+        async for event in processor.extract_stream(pdf_data=data):
+            if first_field is None and event["type"] != "result":
+                first_field = time.perf_counter() - started
+        stages["stream_end_to_end"].append(time.perf_counter() - started)
+        stages["stream_first_field"].append(first_field or stages["stream_end_to_end"][-1])
+    return {
+        "stages": {name: percentiles(samples) for name, samples in stages.items()},
+        "pages": len(pages),
+        "images": len(images),
+        "request_payload_bytes": payload_bytes,
+        "memory": await measure_memory(lambda: processor.extract_text_and_images(pdf_data=data)),
+    }
+
+
+async def bench_throughput(processor, documents: List[bytes], concurrency: int) -> dict:
+    started = time.perf_counter()
+    results = await processor.extract_many(documents, max_concurrency=concurrency)
+    elapsed = time.perf_counter() - started
+    failures = sum(1 for result in results if isinstance(result, Exception))
+    return {
+        "documents": len(documents),
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(len(documents) / elapsed, 3),
+    }
+
+
+async def bench_compare(processor, iterations: int) -> dict:
+    doc2 = {**AGREEMENT, "RentalAmount": "Rs. 32,000 per month", "NoticePeriod": "60 days"}
+    samples = []
+    for _ in range(iterations):
+        await timed(samples, lambda: processor.compare_documents(AGREEMENT, doc2))
+    return percentiles(samples)
+
+
+async def bench_portfolio(processor, sizes: List[int], iterations: int) -> dict:
+    """Time building a portfolio index and comparing one outlier agreement against it."""
+    outlier = {**extracted_agreement(-1), "RentalAmount": "Rs. 1,50,000 per month"}
+    results = {}
+    for size in sizes:
+        build, score, compare = [], [], []
+        for _ in range(iterations):
+            agreements = {f"doc-{seed}": extracted_agreement(seed) for seed in range(size)}
+            started = time.perf_counter()
+            portfolio = PortfolioIndex.from_agreements(agreements)
+            build.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            portfolio.score(outlier)
+            score.append(time.perf_counter() - started)
+            await timed(compare, lambda: processor.compare_to_portfolio(outlier, portfolio))
+        results[str(size)] = {"build": percentiles(build), "score": percentiles(score), "compare": percentiles(compare)}
+    return results
+
+
+async def bench_batch(processor, documents: List[bytes], poll_interval: float) -> dict:
+    """Run documents and one comparison through the batch endpoint, interrupting and resuming it once."""
+    doc2 = {**AGREEMENT, "RentalAmount": "Rs. 32,000 per month", "NoticePeriod": "60 days"}
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, "batch.json")
+        started = time.perf_counter()
+        runner = BatchRunner(processor, checkpoint, poll_interval=poll_interval)
+        task = asyncio.create_task(runner.run(
+            documents={f"doc-{index}": data for index, data in enumerate(documents)},
+            comparisons={"compare-0": (AGREEMENT, doc2)},
+        ))
+        # Simulate a crash once every batch is submitted, then resume from the checkpoint.
+        while not runner.state or not runner.state["batches"] or any(
+                batch["status"] in ("written", "uploaded") for batch in runner.state["batches"]):
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        interrupted = time.perf_counter() - started
+        resumed = BatchRunner(processor, checkpoint, poll_interval=poll_interval)
+        results = await resumed.run()
+        with open(resumed.archive_path) as file:
+            state = json.load(file)
+    return {
+        "documents": len(documents),
+        "requests": len(state["requests"]),
+        "batches": len(state["batches"]),
+        "rounds": state["round"],
+        "extractions": len(results["extractions"]),
+        "comparisons": len(results["comparisons"]),
+        "errors": len(results["errors"]),
+        "interrupted_after_ms": round(interrupted * 1000, 3),
+        "end_to_end_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def bench_docx_conversion(iterations: int) -> dict:
+    """Time LibreOffice DOCX-to-PDF conversion with a fresh profile and with an already built one."""
+    with tempfile.TemporaryDirectory() as directory:
+        converter = DocxConverter(workers=1, profile_dir=directory)
+        if not converter.binary:
+            return {"skipped": "LibreOffice is not installed"}
+        converter.cache = ResultCache(max_entries=0)
+        samples = []
+        # Distinct documents, so every sample is a real conversion.
+        for seed in range(iterations + 1):
+            data = generate_docx(2, seed=seed)
+            started = time.perf_counter()
+            converter.convert(data)
+            samples.append(time.perf_counter() - started)
+    return {"cold_profile_ms": round(samples[0] * 1000, 3), "warm_profile": percentiles(samples[1:])}
+
+
+def telemetry_summary(sink: InMemorySink) -> dict:
+    """Flatten the aggregated counters and stage histograms recorded during the run."""
+    counters = {
+        name + "".join(f"[{key}={value}]" for key, value in labels): value
+        for (name, labels), value in sorted(sink.counters.items())
+    }
+    histograms = {
+        name + "".join(f"[{key}={value}]" for key, value in labels): {
+            "count": histogram.count, "sum": round(histogram.sum, 6),
+        }
+        for (name, labels), histogram in sorted(sink.histograms.items(), key=lambda item: item[0])
+    }
+    return {"counters": counters, "histograms": histograms}
+
+
+async def run(args) -> dict:
+    processor = make_processor()
+    results = {"documents": {}, "docx_conversion": None, "throughput": {}, "compare": None, "portfolio": None,
+               "batch": None, "telemetry": None}
+    try:
+        for pages in args.pages:
+            variants = {
+                f"pdf_text_{pages}p": generate_pdf(pages, text_layer=True),
+                f"pdf_scanned_{pages}p": generate_pdf(pages, text_layer=False),
+                f"docx_{pages}p": generate_docx(pages),
+            }
+            for name, data in variants.items():
+                print(f"Benchmarking {name}...", file=sys.stderr)
+                results["documents"][name] = await bench_document(processor, data, args.iterations)
+
+        print("Benchmarking DOCX conversion...", file=sys.stderr)
+        results["docx_conversion"] = await asyncio.to_thread(bench_docx_conversion, args.iterations)
+
+        batch = [generate_pdf(args.throughput_pages, text_layer=seed % 2 == 0, seed=seed) for seed in range(args.throughput_docs)]
+        for concurrency in args.concurrency:
+            print(f"Measuring throughput at concurrency {concurrency}...", file=sys.stderr)
+            results["throughput"][str(concurrency)] = await bench_throughput(processor, batch, concurrency)
+
+        results["compare"] = await bench_compare(processor, args.iterations)
+        print("Benchmarking portfolio comparison...", file=sys.stderr)
+        results["portfolio"] = await bench_portfolio(processor, args.portfolio_sizes, args.iterations)
+        print("Benchmarking batch submission...", file=sys.stderr)
+        # One document is long enough to be split into page windows.
+        long_document = generate_pdf(processor.chunk_pages * 2, seed=args.throughput_docs)
+        results["batch"] = await bench_batch(processor, batch + [long_document], args.batch_poll_interval)
+        results["telemetry"] = telemetry_summary(processor.telemetry.sinks[0])
+    finally:
+        processor.close()
+    return results
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=parse_int_list, default=[1, 10, 50], help="Page counts to generate.")
+    parser.add_argument("--concurrency", type=parse_int_list, default=[1, 4, 8], help="Concurrency levels for throughput.")
+    parser.add_argument("--iterations", type=int, default=5, help="Repetitions per document.")
+    parser.add_argument("--throughput-docs", type=int, default=16, help="Documents per throughput run.")
+    parser.add_argument("--throughput-pages", type=int, default=5, help="Pages per throughput document.")
+    parser.add_argument("--portfolio-sizes", type=parse_int_list, default=[100, 1000], help="Portfolio sizes to compare against.")
+    parser.add_argument("--batch-latency", type=float, default=1.0, help="Seconds the stub takes to complete a batch.")
+    parser.add_argument("--batch-poll-interval", type=float, default=0.2, help="Batch status polling interval in seconds.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub API latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Stub API latency jitter in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests answered with 429.")
+    parser.add_argument("--completion-tokens", type=int, default=400, help="Completion tokens reported by the stub.")
+    parser.add_argument("--output", help="Write JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    stub = StubOpenAIServer(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, completion_tokens=args.completion_tokens,
+        batch_latency=args.batch_latency,
+    ).start()
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ["OPEN_AI_API_KEY"] = "stub-key"
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        stub.stop()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+        "api_requests": {
+            "count": len(stub.requests),
+            "rate_limited": sum(1 for request in stub.requests if request["status"] == 429),
+            "payload_bytes_total": sum(request["payload_bytes"] for request in stub.requests),
+            "payload_bytes_max": max((request["payload_bytes"] for request in stub.requests), default=0),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
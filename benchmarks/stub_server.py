@@ -0,0 +1,339 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from uuid import uuid4
+
+AGREEMENT = {
+    "PropertyAddress": "Flat 12, Block A, Sector 45, Gurugram",
+    "LandlordName": "Landlord 0",
+    "TenantName": "Tenant 0",
+    "RentalAmount": "Rs. 25,000 per month",
+    "SecurityDeposit": "Rs. 75,000",
+    "LeaseDuration": "11 months",
+    "NoticePeriod": "30 days",
+    "UtilitiesResponsibility": "Tenant",
+    "LatePaymentClause": "Rs. 250 per day after the 5th",
+    "TerminationClause": "Either party with 30 days written notice",
+    "CriticalTerms": [
+        {"FlaggedTerm": "Subletting", "Details": "No subletting without consent", "Inference": "Limits flexibility"},
+    ],
+}
+
+
+def _canned_content(schema_name: str) -> dict:
+    """Return a response that validates against the requested structured-output schema."""
+    if schema_name == "ComparisonReport":
+        return {"ComparisonReport": [
+            {
+                "KeyTerm": "Rental Amount",
+                "Document-1": "Rs. 25,000 per month",
+                "Document-2": "Rs. 32,000 per month",
+                "Mismatch/Comment": "Rent differs",
+                "Inference": "Document-2 costs Rs. 84,000 more per year.",
+            }
+        ]}
+    if schema_name == "ReconciledFields":
+        return {"Fields": []}
+    if schema_name == "PortfolioExplanation":
+        return {"Explanations": [
+            {
+                "Feature": "MonthlyRent",
+                "Explanation": "Rent is well above the portfolio median.",
+                "Inference": "The tenant pays a premium that the agreement's terms do not justify.",
+            }
+        ]}
+    return AGREEMENT
+
+
+class StubOpenAIServer:
+    """Local OpenAI-compatible chat completions server for benchmarks and tests.
+
+    Responses are delayed by ``latency`` (± ``jitter``) seconds, a fraction
+    ``error_rate`` of requests get a 429 with Retry-After, and usage reports
+    ``completion_tokens`` plus a prompt token count derived from the body size.
+    Streaming requests get server-sent chunks of ``stream_chunk_chars`` characters,
+    spread over the other half of the latency. The files and batches endpoints
+    are emulated too: a submitted batch completes after ``batch_latency``
+    seconds, with a fraction ``error_rate`` of its lines written to the error file.
+    Tests can script exact failures with ``fail_next``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.5, jitter: float = 0.1,
+                 error_rate: float = 0.0, completion_tokens: int = 400, bytes_per_token: int = 4,
+                 stream_chunk_chars: int = 16, batch_latency: float = 1.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.completion_tokens = completion_tokens
+        self.bytes_per_token = bytes_per_token
+        self.stream_chunk_chars = stream_chunk_chars
+        self.batch_latency = batch_latency
+        self.requests = []
+        self.files = {}
+        self.batches = {}
+        self._scripted_errors = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def stream_interval(self) -> float:
+        """Delay between streamed chunks, so a whole stream takes about half the latency."""
+        return self.latency / 2 / max(1, len(json.dumps(AGREEMENT)) // self.stream_chunk_chars)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(self, *statuses: int):
+        """Answer the next chat completion requests with these HTTP error statuses, in order."""
+        with self._lock:
+            self._scripted_errors.extend(statuses)
+
+    def scripted_error(self) -> Optional[int]:
+        with self._lock:
+            return self._scripted_errors.popleft() if self._scripted_errors else None
+
+    def record(self, **entry):
+        with self._lock:
+            self.requests.append(entry)
+
+    def completion(self, request: dict, payload_bytes: int) -> dict:
+        """Build the chat completion for ``request`` and record it."""
+        schema_name = request.get("response_format", {}).get("json_schema", {}).get("name", "")
+        prompt_tokens = payload_bytes // self.bytes_per_token
+        self.record(status=200, payload_bytes=payload_bytes, schema=schema_name, prompt_tokens=prompt_tokens,
+                    stream=bool(request.get("stream")))
+        return {
+            "id": f"chatcmpl-{uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(_canned_content(schema_name))},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": prompt_tokens + self.completion_tokens,
+            },
+        }
+
+    def add_file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file = {
+            "id": f"file-{uuid4().hex}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self._lock:
+            self.files[file["id"]] = (file, content)
+        return file
+
+    def create_batch(self, request: dict) -> dict:
+        """Register a batch and process it in the background after ``batch_latency`` seconds."""
+        batch = {
+            "id": f"batch_{uuid4().hex}",
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        with self._lock:
+            self.batches[batch["id"]] = batch
+        threading.Thread(target=self._process_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _process_batch(self, batch: dict):
+        time.sleep(self.batch_latency)
+        _, content = self.files[batch["input_file_id"]]
+        output, errors = [], []
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            result = {"id": f"batch_req_{uuid4().hex}", "custom_id": request["custom_id"], "error": None}
+            if random.random() < self.error_rate:
+                self.record(status=500, payload_bytes=len(line), batch=True)
+                errors.append({**result, "response": {
+                    "status_code": 500, "request_id": uuid4().hex,
+                    "body": {"error": {"message": "The server had an error processing the request."}},
+                }})
+            else:
+                output.append({**result, "response": {
+                    "status_code": 200, "request_id": uuid4().hex,
+                    "body": self.completion(request["body"], len(line)),
+                }})
+
+        def to_file(lines: list, name: str):
+            if not lines:
+                return None
+            data = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+            return self.add_file(data, f"{batch['id']}_{name}.jsonl", "batch_output")["id"]
+
+        batch.update(
+            status="completed",
+            completed_at=int(time.time()),
+            output_file_id=to_file(output, "output"),
+            error_file_id=to_file(errors, "error"),
+            request_counts={"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)},
+        )
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path = self.path.split("?")[0].rstrip("/")
+                if path.endswith("/chat/completions"):
+                    self._chat_completion(body)
+                elif path.endswith("/files"):
+                    self._upload_file(body)
+                elif path.endswith("/batches"):
+                    self._send_json(200, stub.create_batch(json.loads(body)))
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0].rstrip("/")
+                content = re.search(r"/files/([^/]+)/content$", path)
+                file = re.search(r"/files/([^/]+)$", path)
+                batch = re.search(r"/batches/([^/]+)$", path)
+                if content and content.group(1) in stub.files:
+                    data = stub.files[content.group(1)][1]
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                elif file and file.group(1) in stub.files:
+                    self._send_json(200, stub.files[file.group(1)][0])
+                elif batch and batch.group(1) in stub.batches:
+                    self._send_json(200, stub.batches[batch.group(1)])
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def _upload_file(self, body: bytes):
+                """Accept a multipart/form-data upload with ``file`` and ``purpose`` fields."""
+                header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+                message = BytesParser().parsebytes(header + body)
+                fields = {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+                if "file" not in fields:
+                    self._send_json(400, {"error": {"message": "Missing file."}})
+                    return
+                upload = fields["file"]
+                purpose = fields["purpose"].get_payload(decode=True).decode("utf-8") if "purpose" in fields else "batch"
+                self._send_json(200, stub.add_file(upload.get_payload(decode=True), upload.get_filename() or "upload.jsonl", purpose))
+
+            def _chat_completion(self, body: bytes):
+                status = stub.scripted_error()
+                if status is not None:
+                    stub.record(status=status, payload_bytes=len(body))
+                    self._send_json(status, {"error": {"message": f"Scripted error {status}", "type": "stub"}},
+                                    headers={"Retry-After": "0"} if status == 429 else None)
+                    return
+                if random.random() < stub.error_rate:
+                    stub.record(status=429, payload_bytes=len(body))
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                    headers={"Retry-After": "0.1"})
+                    return
+                request = json.loads(body)
+                # Streamed responses spend part of the latency emitting chunks instead.
+                latency = stub.latency * (0.5 if request.get("stream") else 1.0)
+                time.sleep(max(0.0, latency + random.uniform(-stub.jitter, stub.jitter)))
+                completion = stub.completion(request, len(body))
+                if request.get("stream"):
+                    self._stream_completion(request, completion["choices"][0]["message"]["content"], completion["usage"])
+                    return
+                self._send_json(200, completion)
+
+            def _stream_completion(self, request: dict, content: str, usage: dict):
+                """Send ``content`` as server-sent chat.completion.chunk events, spread over the latency."""
+                pieces = [content[index:index + stub.stream_chunk_chars]
+                          for index in range(0, len(content), stub.stream_chunk_chars)]
+                base = {
+                    "id": f"chatcmpl-{uuid4().hex}",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                }
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+
+                def send(chunk: dict):
+                    self.wfile.write(f"data: {json.dumps({**base, **chunk})}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                try:
+                    send({"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+                    for piece in pieces:
+                        time.sleep(stub.stream_interval)
+                        send({"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                    send({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                    if request.get("stream_options", {}).get("include_usage"):
+                        send({"choices": [], "usage": usage})
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client stopped reading the stream
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server.")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    server = StubOpenAIServer(port=args.port, latency=args.latency, error_rate=args.error_rate).start()
+    print(f"Stub OpenAI server listening on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
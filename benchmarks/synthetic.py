@@ -0,0 +1,127 @@
+import io
+import random
+import zipfile
+import fitz  # PyMuPDF
+from typing import List
+
+CLAUSES = [
+    "The Tenant shall pay a monthly rent of Rs. {rent:,}/- on or before the 5th day of each calendar month.",
+    "The Tenant has paid a refundable security deposit of Rs. {deposit:,}/- which shall be returned on vacating the premises.",
+    "This agreement is valid for a period of {months} months commencing from the date of execution.",
+    "Either party may terminate this agreement by giving {notice} days written notice to the other party.",
+    "Electricity, water and maintenance charges shall be borne by the {utilities}.",
+    "A late fee of Rs. {late_fee} per day shall be charged if the rent is not paid by the due date.",
+    "The Tenant shall not sublet, assign or part with the possession of the premises without prior written consent.",
+    "The Tenant shall keep the premises in good condition and shall be liable for any damage beyond normal wear and tear.",
+    "The Landlord may inspect the premises with 24 hours prior notice at a reasonable time of the day.",
+    "The premises shall be used for residential purposes only and no commercial activity shall be carried out.",
+]
+
+BOILERPLATE = (
+    "The parties agree that the terms and conditions set out herein constitute the entire agreement between them "
+    "and supersede all prior understandings. Any amendment shall be valid only if made in writing and signed by both parties. "
+)
+
+
+def agreement_terms(seed: int) -> dict:
+    """Return the variable terms of a synthetic agreement."""
+    rng = random.Random(seed)
+    return {
+        "landlord": f"Landlord {seed}",
+        "tenant": f"Tenant {seed}",
+        "address": f"Flat {rng.randint(1, 999)}, Block {rng.choice('ABCDE')}, Sector {rng.randint(1, 60)}, Gurugram",
+        "rent": rng.choice([18000, 22000, 25000, 32000, 45000]),
+        "deposit": rng.choice([50000, 75000, 100000]),
+        "months": rng.choice([11, 12, 24]),
+        "notice": rng.choice([30, 60, 90]),
+        "utilities": rng.choice(["Tenant", "Owner"]),
+        "late_fee": rng.choice([100, 250, 500]),
+    }
+
+
+def extracted_agreement(seed: int = 0) -> dict:
+    """Return the extraction result a model would produce for the synthetic agreement ``seed``."""
+    terms = agreement_terms(seed)
+    return {
+        "PropertyAddress": terms["address"],
+        "LandlordName": terms["landlord"],
+        "TenantName": terms["tenant"],
+        "RentalAmount": f"Rs. {terms['rent']:,} per month",
+        "SecurityDeposit": f"Rs. {terms['deposit']:,}",
+        "LeaseDuration": f"{terms['months']} months",
+        "NoticePeriod": f"{terms['notice']} days",
+        "UtilitiesResponsibility": terms["utilities"],
+        "LatePaymentClause": f"Rs. {terms['late_fee']} per day after the due date",
+        "TerminationClause": f"Either party with {terms['notice']} days written notice",
+        "CriticalTerms": [],
+    }
+
+
+def agreement_pages(pages: int, seed: int = 0) -> List[str]:
+    """Return the text of each page of a synthetic rental agreement."""
+    terms = agreement_terms(seed)
+    header = (
+        f"RENT AGREEMENT\n\nThis agreement is made between {terms['landlord']} (Landlord) and {terms['tenant']} (Tenant) "
+        f"for the premises at {terms['address']}.\n\n"
+    )
+    texts = []
+    for page_num in range(pages):
+        body = header if page_num == 0 else ""
+        for index in range(6):
+            clause = CLAUSES[(page_num * 6 + index) % len(CLAUSES)].format(**terms)
+            body += f"{page_num * 6 + index + 1}. {clause} {BOILERPLATE}\n\n"
+        texts.append(body)
+    return texts
+
+
+def generate_pdf(pages: int, text_layer: bool = True, seed: int = 0) -> bytes:
+    """Build a synthetic agreement PDF; without a text layer every page is a scanned-style image."""
+    source = fitz.open()
+    for text in agreement_pages(pages, seed):
+        page = source.new_page()
+        page.insert_textbox(fitz.Rect(54, 54, page.rect.width - 54, page.rect.height - 54), text, fontsize=10)
+    if text_layer:
+        return source.tobytes()
+
+    scanned = fitz.open()
+    for page in source:
+        image = page.get_pixmap(dpi=150).tobytes("png")
+        scanned.new_page(width=page.rect.width, height=page.rect.height).insert_image(page.rect, stream=image)
+    return scanned.tobytes()
+
+
+def generate_docx(pages: int, seed: int = 0) -> bytes:
+    """Build a minimal synthetic agreement DOCX with one paragraph per clause."""
+    namespace = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraphs = "".join(
+        f"<w:p><w:r><w:t xml:space=\"preserve\">{paragraph.strip()}</w:t></w:r></w:p>"
+        for text in agreement_pages(pages, seed)
+        for paragraph in text.split("\n\n")
+        if paragraph.strip()
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>',
+        )
+        archive.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/>'
+            '</Relationships>',
+        )
+        archive.writestr(
+            "word/document.xml",
+            f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{namespace}"><w:body>{paragraphs}</w:body></w:document>',
+        )
+    return buffer.getvalue()
@@ -1,25 +1,18 @@
 import streamlit as st
 import asyncio
-import pandas as pd
-import shutil
-from uuid import uuid4
-from copy import deepcopy
+from collections import OrderedDict
 
 import sys
 import os
 # Add the root directory (where 'services' is located) to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from services.document_processor import DocumentProcessor
-from utils.constants import FrontendConstants
+from utils.cache import ResultCache
+from utils.constants import CacheConstants
 
 # Streamlit multipage setup
 st.set_page_config(page_title="Rent Agreement Tool", layout="wide")
 
-# Base directory for uploaded files
-BASE_DIR = FrontendConstants.UPLOAD_DIR
-os.makedirs(BASE_DIR, exist_ok=True)
-
 # Initialize session state variables
 if "acr" not in st.session_state:
     st.session_state["acr"] = False
@@ -27,55 +20,133 @@ if "doc1_data" not in st.session_state:
     st.session_state["doc1_data"] = None
 if "doc2_data" not in st.session_state:
     st.session_state["doc2_data"] = None
+if "comparison_cache" not in st.session_state:
+    st.session_state["comparison_cache"] = OrderedDict()
 
-# Initialize DocumentProcessor
-processor = DocumentProcessor()
+@st.cache_resource
+def get_processor():
+    """
+    Build the DocumentProcessor once per server process.
 
-class FileManager:
-    """Handles file saving and cleanup operations."""
+    The import is deferred so PyMuPDF, openai and pydantic are only loaded when a
+    document is first processed, not on every script rerun.
+    """
+    from services.document_processor import DocumentProcessor
+    return DocumentProcessor()
 
-    @staticmethod
-    def save_uploaded_file(uploaded_file):
-        """
-        Save the uploaded file to a folder with a UUID.
+@st.cache_resource
+def get_comparison_cache():
+    """Process-wide comparison cache shared by every session."""
+    return ResultCache(max_entries=CacheConstants.COMPARISON_PROCESS_MAX_ENTRIES)
+
+def get_cached_comparison(key):
+    """
+    Look up a comparison report in the session cache, then the process cache.
 
-        Args:
-            uploaded_file: The uploaded file object from Streamlit.
+    Args:
+        key: The comparison cache key.
+
+    Returns:
+        The cached comparison report, or None on a miss.
+    """
+    session_cache = st.session_state["comparison_cache"]
+    if key in session_cache:
+        session_cache.move_to_end(key)
+        return session_cache[key]
+    comparison = get_comparison_cache().get(key)
+    if comparison is not None:
+        remember_comparison(key, comparison, process_tier=False)
+    return comparison
+
+def remember_comparison(key, comparison, process_tier=True):
+    """
+    Store a comparison report in the bounded session cache and the process cache.
 
-        Returns:
-            A tuple containing the file path and folder path.
-        """
-        folder_path = os.path.join(BASE_DIR, str(uuid4()))
-        os.makedirs(folder_path, exist_ok=True)
-        file_path = os.path.join(folder_path, uploaded_file.name)
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.read())
-        return file_path, folder_path
+    Args:
+        key: The comparison cache key.
+        comparison: The comparison report to store.
+        process_tier: Whether to also store the report in the process cache.
+    """
+    session_cache = st.session_state["comparison_cache"]
+    session_cache[key] = comparison
+    session_cache.move_to_end(key)
+    while len(session_cache) > CacheConstants.COMPARISON_SESSION_MAX_ENTRIES:
+        session_cache.popitem(last=False)
+    if process_tier:
+        get_comparison_cache().set(key, comparison)
+
+async def extract_and_set_state(documents, doc_keys):
+    """
+    Extract data from all documents concurrently, filling in each document's tables as fields arrive,
+    and update session state with the final results.
 
-    @staticmethod
-    def cleanup_folder(folder_path):
-        """
-        Clean up the temporary folder created for uploaded files.
+    Args:
+        documents: The uploaded document contents as bytes.
+        doc_keys: The session state keys to update with extracted data, in the same order.
+    """
+    processor = get_processor()
+
+    async def stream_one(document, doc_key, number, container):
+        container.subheader(f"Extracted Data from Document {number}")
+        fields_slot, terms_heading_slot, terms_slot = container.empty(), container.empty(), container.empty()
+        fields, critical_terms = {}, []
+        async for event in processor.extract_stream(pdf_data=document):
+            if event["type"] == "result":
+                st.session_state[doc_key] = event["value"]
+            elif event["key"] == "CriticalTerms":
+                if event["type"] == "item":
+                    critical_terms.append(event["value"])
+                    terms_heading_slot.subheader(f"Critical Terms Document {number}")
+                    terms_slot.table(critical_terms)
+            elif event["type"] == "field":
+                fields[event["key"]] = event["value"]
+                fields_slot.table({"Value": fields})
+
+    containers = [st.container() for _ in documents]
+    results = await asyncio.gather(
+        *(stream_one(document, doc_key, index + 1, container)
+          for index, (document, doc_key, container) in enumerate(zip(documents, doc_keys, containers))),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            st.error(f"An error occurred during data extraction: {result}")
+
+async def stream_comparison(doc1, doc2, report_slot):
+    """
+    Compare two documents, showing each report row as soon as it is decided.
 
-        Args:
-            folder_path: The path of the folder to delete.
-        """
-        if os.path.exists(folder_path):
-            shutil.rmtree(folder_path)
+    Args:
+        doc1: The extracted data of the first document.
+        doc2: The extracted data of the second document.
+        report_slot: The placeholder the report table is rendered into.
 
-async def extract_and_set_state(file_path, doc_key):
+    Returns:
+        The final comparison report.
     """
-    Extract data asynchronously and update session state.
+    rows = []
+    async for event in get_processor().compare_stream(doc1, doc2):
+        if event["type"] == "item":
+            rows.append(event["value"])
+            report_slot.table(rows)
+        elif event["type"] == "result":
+            return event["value"]
+
+def render_extracted_data(data, number):
+    """
+    Render one document's extracted fields and critical terms as tables.
 
     Args:
-        file_path: The path to the uploaded file.
-        doc_key: The session state key to update with extracted data.
+        data: The extracted data for the document.
+        number: The document number shown in the headings.
     """
-    try:
-        extracted_data = await processor.extract_text_and_images(pdf_file=file_path)
-        st.session_state[doc_key] = extracted_data
-    except Exception as e:
-        st.error(f"An error occurred during data extraction: {e}")
+    st.subheader(f"Extracted Data from Document {number}")
+    fields = {key: value for key, value in data.items() if key != "CriticalTerms"}
+    st.table({"Value": fields})
+    critical_terms = data.get("CriticalTerms")
+    if critical_terms:
+        st.subheader(f"Critical Terms Document {number}")
+        st.table(critical_terms)
 
 def main_page():
     """
@@ -95,14 +166,9 @@ def main_page():
             if not doc1 or not doc2:
                 st.error("Please upload both documents to proceed.")
             else:
-                doc1_path, folder1 = FileManager.save_uploaded_file(doc1)
-                doc2_path, folder2 = FileManager.save_uploaded_file(doc2)
-
                 with st.spinner("Extracting data from documents, please wait..."):
-                    asyncio.run(extract_and_set_state(doc1_path, "doc1_data"))
-                    asyncio.run(extract_and_set_state(doc2_path, "doc2_data"))
-                    FileManager.cleanup_folder(folder1)
-                    FileManager.cleanup_folder(folder2)
+                    # PDF and DOCX uploads are told apart by their content, so no copy on disk is needed.
+                    asyncio.run(extract_and_set_state([doc1.getvalue(), doc2.getvalue()], ["doc1_data", "doc2_data"]))
 
                 if st.session_state["doc1_data"] and st.session_state["doc2_data"]:
                     st.rerun()
@@ -116,23 +182,8 @@ def extracted_data_page():
     """
     st.title("Extracted Data")
 
-    st.subheader("Extracted Data from Document 1")
-    doc1_data = deepcopy(st.session_state["doc1_data"])
-    critical_terms_doc1 = doc1_data.pop("CriticalTerms", None)
-    doc1_df = pd.DataFrame.from_dict(doc1_data, orient="index", columns=["Value"])
-    st.table(doc1_df)
-    if critical_terms_doc1:
-        st.subheader("Critical Terms Document 1")
-        st.table(critical_terms_doc1)
-
-    st.subheader("Extracted Data from Document 2")
-    doc2_data = deepcopy(st.session_state["doc2_data"])
-    critical_terms_doc2 = doc2_data.pop("CriticalTerms", None)
-    doc2_df = pd.DataFrame.from_dict(doc2_data, orient="index", columns=["Value"])
-    st.table(doc2_df)
-    if critical_terms_doc2:
-        st.subheader("Critical Terms Document 2")
-        st.table(critical_terms_doc2)
+    render_extracted_data(st.session_state["doc1_data"], 1)
+    render_extracted_data(st.session_state["doc2_data"], 2)
 
     if st.button("Agreement Comparison Report") and st.session_state["acr"]!=True:
         st.session_state["acr"] = True
@@ -144,37 +195,29 @@ def comparison_page():
     """
     st.title("Agreement Comparison Report")
 
-    with st.spinner("Comparing documents, please wait..."):
-        try:
-            comparison = asyncio.run(
-                processor.compare_documents(st.session_state["doc1_data"], st.session_state["doc2_data"])
-            )
-            st.subheader("Comparison Report")
-            # Convert the comparison response into a DataFrame
-            comparison_df = pd.DataFrame(comparison['ComparisonReport'])
-            st.table(comparison_df)
-        except Exception as e:
-            st.error(f"An error occurred during comparison: {e}")
+    processor = get_processor()
+    cache_key = processor.comparison_cache_key(st.session_state["doc1_data"], st.session_state["doc2_data"])
+    comparison = get_cached_comparison(cache_key)
+    st.subheader("Comparison Report")
+    report_slot = st.empty()
+    if comparison is None:
+        with st.spinner("Comparing documents, please wait..."):
+            try:
+                comparison = asyncio.run(
+                    stream_comparison(st.session_state["doc1_data"], st.session_state["doc2_data"], report_slot)
+                )
+                remember_comparison(cache_key, comparison)
+            except Exception as e:
+                st.error(f"An error occurred during comparison: {e}")
+
+    if comparison is not None:
+        # The final report is ordered by field, unlike the rows as they streamed in.
+        report_slot.table(comparison['ComparisonReport'])
 
     st.title("Extracted Data")
 
-    st.subheader("Extracted Data from Document 1")
-    doc1_data = deepcopy(st.session_state["doc1_data"])
-    critical_terms_doc1 = doc1_data.pop("CriticalTerms", None)
-    doc1_df = pd.DataFrame.from_dict(doc1_data, orient="index", columns=["Value"])
-    st.table(doc1_df)
-    if critical_terms_doc1:
-        st.subheader("Critical Terms Document 1")
-        st.table(critical_terms_doc1)
-
-    st.subheader("Extracted Data from Document 2")
-    doc2_data = deepcopy(st.session_state["doc2_data"])
-    critical_terms_doc2 = doc2_data.pop("CriticalTerms", None)
-    doc2_df = pd.DataFrame.from_dict(doc2_data, orient="index", columns=["Value"])
-    st.table(doc2_df)
-    if critical_terms_doc2:
-        st.subheader("Critical Terms Document 2")
-        st.table(critical_terms_doc2)
+    render_extracted_data(st.session_state["doc1_data"], 1)
+    render_extracted_data(st.session_state["doc2_data"], 2)
 
 
 # Page routing logic
@@ -0,0 +1,416 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from services.chunking import merge_partial_agreements, page_windows
+from services.comparison import comparison_payload, merge_report, pre_diff
+from services.openai_transport import response_format_param
+from services.payload import RequestBody
+from utils.cache import hash_bytes, hash_json
+from utils.constants import BatchConstants
+from utils.prompts import PARTIAL_EXTRACT_NOTE, ComparisonReport, PartialRentalAgreement, RentalAgreement
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+SCHEMAS = {
+    "RentalAgreement": RentalAgreement,
+    "PartialRentalAgreement": PartialRentalAgreement,
+    "ComparisonReport": ComparisonReport,
+}
+
+
+class CheckpointMismatchError(ValueError):
+    """Raised when a checkpoint records a batch run for different inputs."""
+
+
+def inputs_fingerprint(documents: Optional[Dict[str, Union[bytes, str]]],
+                       comparisons: Optional[Dict[str, Tuple[dict, dict]]]) -> str:
+    """Identify a batch run's inputs: document ids with their content hash or path, and the comparisons."""
+    return hash_json({
+        "documents": {
+            document_id: hash_bytes(bytes(document)) if isinstance(document, (bytes, bytearray)) else document
+            for document_id, document in (documents or {}).items()
+        },
+        "comparisons": comparisons or {},
+    })
+
+
+class BatchRunner:
+    """Run extractions and comparisons through the provider's batch endpoint.
+
+    Requests are built with the processor's own message builders and written
+    to JSONL files, uploaded and submitted as batches, then polled until they
+    finish; results are mapped back to the source documents. Every step is
+    recorded in a local checkpoint file, so a crashed or interrupted run
+    resumes where it stopped (re-polling submitted batches rather than
+    submitting them again); the checkpoint records a fingerprint of its
+    inputs, so it is never resumed for different ones. Failed requests are
+    resubmitted in a new batch up to ``max_rounds`` times. Once the results
+    are assembled the checkpoint is archived and the JSONL files deleted.
+    """
+
+    def __init__(self, processor, checkpoint_path: str, poll_interval: float = BatchConstants.POLL_INTERVAL,
+                 max_rounds: int = BatchConstants.MAX_ROUNDS,
+                 max_requests_per_batch: int = BatchConstants.MAX_REQUESTS_PER_BATCH,
+                 max_batch_bytes: int = BatchConstants.MAX_BATCH_BYTES):
+        self.processor = processor
+        self.checkpoint_path = checkpoint_path
+        self.work_dir = os.path.splitext(checkpoint_path)[0] + ".files"
+        self.archive_path = os.path.splitext(checkpoint_path)[0] + ".completed.json"
+        self.poll_interval = poll_interval
+        self.max_rounds = max_rounds
+        self.max_requests_per_batch = max_requests_per_batch
+        self.max_batch_bytes = max_batch_bytes
+        self.state = None
+
+    async def run(self, documents: Optional[Dict[str, Union[bytes, str]]] = None,
+                  comparisons: Optional[Dict[str, Tuple[dict, dict]]] = None) -> dict:
+        """Run (or resume) a batch and return its results.
+
+        ``documents`` maps ids to PDF/DOCX bytes or file paths and ``comparisons``
+        maps ids to pairs of extraction results. When the checkpoint already
+        exists the recorded run is resumed; it may be called without inputs to
+        do so, but inputs that differ from the recorded run's are refused with
+        ``CheckpointMismatchError``.
+        """
+        self.state = self._load_checkpoint()
+        if self.state is None:
+            await self.prepare(documents or {}, comparisons or {})
+        else:
+            if (documents or comparisons) and self.state.get("fingerprint") != inputs_fingerprint(documents, comparisons):
+                raise CheckpointMismatchError(
+                    f"The checkpoint {self.checkpoint_path} belongs to a batch run with different inputs; "
+                    "use another checkpoint path or resume it without inputs."
+                )
+            logger.info(f"Resuming batch run from {self.checkpoint_path} ({self._summary()}).")
+
+        while True:
+            await self._submit_pending()
+            await self._wait_for_batches()
+            await self._collect_finished()
+            failed = [custom_id for custom_id, request in self.state["requests"].items() if request["status"] == "failed"]
+            if not failed or self.state["round"] >= self.max_rounds:
+                break
+            self.state["round"] += 1
+            logger.info(f"Resubmitting {len(failed)} failed request(s), round {self.state['round']}.")
+            self._write_batches(failed)
+            self._save_checkpoint()
+
+        if "results" not in self.state:
+            self.state["results"] = await self._assemble_results()
+            self._save_checkpoint()
+        self._archive_checkpoint()
+        return self.state["results"]
+
+    async def prepare(self, documents: Dict[str, Union[bytes, str]], comparisons: Dict[str, Tuple[dict, dict]]):
+        """Render the documents and write every request to JSONL batch files."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.state = {
+            "fingerprint": inputs_fingerprint(documents, comparisons),
+            "created_at": time.time(),
+            "round": 1,
+            "requests": {},
+            "local": {"extractions": {}, "comparisons": {}},
+            "documents": {},
+            "comparisons": {},
+            "build_errors": {},
+            "batches": [],
+        }
+        lines_path = os.path.join(self.work_dir, "requests.jsonl")
+        semaphore = asyncio.Semaphore(self.processor.max_concurrency)
+
+        with open(lines_path, "wb") as file:
+            async def build_document(document_id: str, document: Union[bytes, str]):
+                # Each document's lines are written as soon as it is rendered, so only
+                # ``max_concurrency`` documents' page images are held at once.
+                async with semaphore:
+                    try:
+                        requests = await self._document_requests(document_id, document)
+                    except Exception as e:
+                        logger.error(f"Could not prepare document {document_id}: {e}")
+                        self.state["documents"].pop(document_id, None)
+                        self.state["build_errors"][document_id] = f"Could not prepare document: {e}"
+                        return
+                    for custom_id, meta, body in requests:
+                        self._add_request(file, custom_id, meta, body)
+
+            await asyncio.gather(*(build_document(document_id, document) for document_id, document in documents.items()))
+            for comparison_id, (doc1, doc2) in comparisons.items():
+                for custom_id, meta, body in self._comparison_requests(comparison_id, doc1, doc2):
+                    self._add_request(file, custom_id, meta, body)
+        self.state["lines_path"] = lines_path
+        self._write_batches(list(self.state["requests"]))
+        self._save_checkpoint()
+        logger.info(f"Prepared batch run with {self._summary()}.")
+
+    async def _document_requests(self, document_id: str, document: Union[bytes, str]) -> List[Tuple[str, dict, dict]]:
+        """Build the extraction request(s) of one document; cached documents need none."""
+        processor = self.processor
+        data = document if isinstance(document, (bytes, bytearray)) else None
+        path = None if data is not None else document
+        cache_key = processor._extraction_cache_key(data, path)
+        self.state["documents"][document_id] = {"cache_key": cache_key, "windows": []}
+        cached = processor.extraction_cache.get(cache_key)
+        if cached is not None:
+            self.state["local"]["extractions"][document_id] = cached
+            return []
+
+        pages = await (processor._extract_from_binary(bytes(data)) if data is not None else processor._extract_from_file(path))
+        if len(pages) <= processor.chunk_pages:
+            page_text, images = processor._join_pages(pages)
+            messages = processor._prepare_extraction_messages(images, page_text)
+            custom_id = f"extract:{document_id}"
+            self.state["documents"][document_id]["windows"] = [custom_id]
+            return [(custom_id, {"kind": "extract", "source": document_id, "schema": "RentalAgreement"},
+                     self._request_body(messages, RentalAgreement))]
+
+        requests = []
+        for number, (start, window) in enumerate(page_windows(pages, processor.chunk_pages)):
+            page_text, images = processor._join_pages(window)
+            note = PARTIAL_EXTRACT_NOTE.format(first_page=start + 1, last_page=start + len(window), page_count=len(pages))
+            messages = processor._prepare_extraction_messages(images, page_text, note=note)
+            custom_id = f"extract:{document_id}:{number}"
+            requests.append((
+                custom_id,
+                {"kind": "extract_window", "source": document_id, "schema": "PartialRentalAgreement",
+                 "label": f"pages {start + 1}-{start + len(window)}"},
+                self._request_body(messages, PartialRentalAgreement),
+            ))
+        self.state["documents"][document_id]["windows"] = [custom_id for custom_id, _, _ in requests]
+        return requests
+
+    def _comparison_requests(self, comparison_id: str, doc1: dict, doc2: dict) -> List[Tuple[str, dict, dict]]:
+        """Build the comparison request for the fields pre-diff could not decide locally."""
+        local_entries, differing = pre_diff(doc1, doc2)
+        self.state["comparisons"][comparison_id] = {"local_entries": local_entries}
+        if not differing:
+            self.state["local"]["comparisons"][comparison_id] = merge_report(local_entries, [])
+            return []
+        messages = self.processor._prepare_comparison_messages(
+            comparison_payload(doc1, differing), comparison_payload(doc2, differing), partial=bool(local_entries),
+        )
+        custom_id = f"compare:{comparison_id}"
+        return [(custom_id, {"kind": "compare", "source": comparison_id, "schema": "ComparisonReport"},
+                 self._request_body(messages, ComparisonReport))]
+
+    def _request_body(self, messages: List[dict], response_format) -> dict:
+        return {
+            "messages": messages,
+            "response_format": response_format_param(response_format),
+            **self.processor.model_params,
+        }
+
+    def _add_request(self, file, custom_id: str, meta: dict, body: dict):
+        # Page images are streamed into the file rather than serialized into one string per line.
+        line = RequestBody({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body})
+        offset = file.tell()
+        line.write_to(file)
+        file.write(b"\n")
+        self.state["requests"][custom_id] = {**meta, "status": "pending", "offset": offset, "length": line.size + 1}
+
+    def _write_batches(self, custom_ids: List[str]):
+        """Split requests into batch files within the provider's size limits."""
+        batch, size = [], 0
+        with open(self.state["lines_path"], "rb") as source:
+            for custom_id in custom_ids:
+                request = self.state["requests"][custom_id]
+                if batch and (len(batch) >= self.max_requests_per_batch or size + request["length"] > self.max_batch_bytes):
+                    self._write_batch_file(source, batch)
+                    batch, size = [], 0
+                batch.append(custom_id)
+                size += request["length"]
+                request["status"] = "pending"
+            if batch:
+                self._write_batch_file(source, batch)
+
+    def _write_batch_file(self, source, custom_ids: List[str]):
+        path = os.path.join(self.work_dir, f"batch-{len(self.state['batches']) + 1:04d}.jsonl")
+        with open(path, "wb") as file:
+            for custom_id in custom_ids:
+                request = self.state["requests"][custom_id]
+                source.seek(request["offset"])
+                file.write(source.read(request["length"]))
+        self.state["batches"].append({"path": path, "custom_ids": custom_ids, "status": "written"})
+
+    async def _submit_pending(self):
+        llm_client = self.processor.llm_client
+        for batch in self.state["batches"]:
+            if batch["status"] == "written":
+                with open(batch["path"], "rb") as file:
+                    uploaded = await llm_client.call(lambda client: client.files.create(file=file, purpose="batch"))
+                batch.update(file_id=uploaded.id, status="uploaded")
+                self._save_checkpoint()
+            if batch["status"] == "uploaded":
+                created = await llm_client.call(lambda client: client.batches.create(
+                    input_file_id=batch["file_id"],
+                    endpoint=BATCH_ENDPOINT,
+                    completion_window=BatchConstants.COMPLETION_WINDOW,
+                ))
+                batch.update(batch_id=created.id, status="submitted")
+                self._save_checkpoint()
+                logger.info(f"Submitted batch {created.id} with {len(batch['custom_ids'])} request(s).")
+
+    async def _wait_for_batches(self):
+        llm_client = self.processor.llm_client
+        while True:
+            pending = [batch for batch in self.state["batches"] if batch["status"] == "submitted"]
+            if not pending:
+                return
+            for batch in pending:
+                remote = await llm_client.call(lambda client: client.batches.retrieve(batch["batch_id"]))
+                if remote.status in FINAL_STATUSES:
+                    batch.update(
+                        status="finished",
+                        remote_status=remote.status,
+                        output_file_id=remote.output_file_id,
+                        error_file_id=remote.error_file_id,
+                    )
+                    self._save_checkpoint()
+                    logger.info(f"Batch {batch['batch_id']} finished with status {remote.status}.")
+            if any(batch["status"] == "submitted" for batch in pending):
+                await asyncio.sleep(self.poll_interval)
+
+    async def _collect_finished(self):
+        """Download the output of finished batches and record each request's response."""
+        llm_client = self.processor.llm_client
+        for batch in self.state["batches"]:
+            if batch["status"] != "finished":
+                continue
+            lines = []
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if file_id:
+                    content = await llm_client.call(lambda client: client.files.content(file_id))
+                    lines.extend(line for line in content.text.splitlines() if line.strip())
+            for line in lines:
+                self._record_response(json.loads(line))
+            for custom_id in batch["custom_ids"]:
+                request = self.state["requests"][custom_id]
+                if request["status"] == "pending":
+                    request.update(status="failed", error=f"No result (batch {batch.get('remote_status')}).")
+            batch["status"] = "collected"
+            self._save_checkpoint()
+
+    def _record_response(self, line: dict):
+        request = self.state["requests"].get(line.get("custom_id"))
+        if request is None or request["status"] == "succeeded":
+            return
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or response.get("body", {}).get("error") or response.get("status_code")
+            request.update(status="failed", error=str(error))
+            return
+        try:
+            message = response["body"]["choices"][0]["message"]
+            parsed = SCHEMAS[request["schema"]].model_validate_json(message["content"])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            request.update(status="failed", error=f"Response could not be parsed: {e}")
+            return
+        request.pop("error", None)
+        request.update(status="succeeded", result=parsed.dict(by_alias=True))
+
+    async def _assemble_results(self) -> dict:
+        """Map request results back to their source documents and comparisons."""
+        requests = self.state["requests"]
+        extractions = dict(self.state["local"]["extractions"])
+        comparisons = dict(self.state["local"]["comparisons"])
+        errors = dict(self.state.get("build_errors", {}))
+
+        for document_id, document in self.state["documents"].items():
+            if document_id in extractions:
+                continue
+            windows = [requests[custom_id] for custom_id in document["windows"]]
+            failed = [window["error"] for window in windows if window["status"] != "succeeded"]
+            if failed:
+                errors[document_id] = failed[0]
+                continue
+            if len(windows) == 1 and windows[0]["kind"] == "extract":
+                result = windows[0]["result"]
+            else:
+                merged, conflicts = merge_partial_agreements(
+                    [window["result"] for window in windows], [window["label"] for window in windows]
+                )
+                if conflicts:
+                    # Conflicts are rare and small, so they are reconciled interactively.
+                    merged.update(await self.processor._reconcile_fields(conflicts))
+                result = PartialRentalAgreement(**merged).dict(by_alias=True)
+            self.processor.extraction_cache.set(document["cache_key"], result)
+            extractions[document_id] = result
+
+        for comparison_id, comparison in self.state["comparisons"].items():
+            if comparison_id in comparisons:
+                continue
+            request = requests[f"compare:{comparison_id}"]
+            if request["status"] != "succeeded":
+                errors[comparison_id] = request["error"]
+                continue
+            comparisons[comparison_id] = merge_report(comparison["local_entries"], request["result"]["ComparisonReport"])
+
+        logger.info(f"Batch run produced {len(extractions)} extraction(s), {len(comparisons)} comparison(s), {len(errors)} error(s).")
+        return {"extractions": extractions, "comparisons": comparisons, "errors": errors}
+
+    def _summary(self) -> str:
+        statuses = {}
+        for request in self.state["requests"].values():
+            statuses[request["status"]] = statuses.get(request["status"], 0) + 1
+        return f"{len(self.state['requests'])} request(s) in {len(self.state['batches'])} batch(es), {statuses}"
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_checkpoint(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        temp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.state, file, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _archive_checkpoint(self):
+        """Move a finished run's checkpoint aside and delete its request files, so the path can be reused."""
+        os.replace(self.checkpoint_path, self.archive_path)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        logger.info(f"Batch run complete; checkpoint archived to {self.archive_path}.")
+
+
+def main():
+    from services.document_processor import DocumentProcessor
+
+    parser = argparse.ArgumentParser(description="Extract agreements through the OpenAI batch endpoint.")
+    parser.add_argument("files", nargs="*", help="PDF or DOCX files to extract (optional when resuming).")
+    parser.add_argument("--checkpoint", help="Checkpoint file; rerun with the same path to resume. "
+                                             "Defaults to one named after the files.")
+    parser.add_argument("--poll-interval", type=float, default=BatchConstants.POLL_INTERVAL)
+    parser.add_argument("--output", help="Write the results as JSON to this file instead of stdout.")
+    args = parser.parse_args()
+    documents = {os.path.abspath(path): path for path in args.files}
+    if not documents and not args.checkpoint:
+        parser.error("give the files to extract, or --checkpoint to resume a run")
+    checkpoint = args.checkpoint or os.path.join(
+        BatchConstants.CHECKPOINT_DIR, f"batch-{inputs_fingerprint(documents, None)[:16]}.json"
+    )
+
+    processor = DocumentProcessor()
+    runner = BatchRunner(processor, checkpoint, poll_interval=args.poll_interval)
+    try:
+        results = asyncio.run(runner.run(documents=documents))
+    finally:
+        processor.close()
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import logging
+from typing import List, Tuple
+from services.comparison import COMPARED_FIELDS, is_empty_value, match_field, normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+def page_windows(pages: List[dict], window_size: int) -> List[Tuple[int, List[dict]]]:
+    """Split pages into consecutive windows, returning ``(first_page_index, pages)`` pairs."""
+    return [(start, pages[start:start + window_size]) for start in range(0, len(pages), window_size)]
+
+
+def merge_critical_terms(term_lists) -> List[dict]:
+    """Return the union of several CriticalTerms lists, de-duplicated by flagged term."""
+    critical_terms, seen = [], set()
+    for terms in term_lists:
+        for term in terms:
+            key = normalize_text(term.get("FlaggedTerm"))
+            if key and key not in seen:
+                seen.add(key)
+                critical_terms.append(term)
+    return critical_terms
+
+
+def merge_partial_agreements(partials: List[dict], labels: List[str]) -> Tuple[dict, dict]:
+    """Merge per-window RentalAgreement dicts, in page order.
+
+    Scalar fields take the first non-empty value, or stay "" (unknown) when no
+    window states them; CriticalTerms are the de-duplicated union. Returns the merged dict and, for each field whose
+    non-empty values disagree, the distinct candidates with the window label
+    (e.g. "pages 9-16") each was found in.
+    """
+    merged, conflicts = {}, {}
+    for field in COMPARED_FIELDS:
+        candidates = []
+        for partial, label in zip(partials, labels):
+            value = partial.get(field, "")
+            if is_empty_value(value):
+                continue
+            if not any(match_field(field, value, candidate["Value"]) for candidate in candidates):
+                candidates.append({"Value": value, "Pages": label})
+        merged[field] = candidates[0]["Value"] if candidates else ""
+        if len(candidates) > 1:
+            conflicts[field] = candidates
+
+    merged["CriticalTerms"] = merge_critical_terms(partial.get("CriticalTerms", []) for partial in partials)
+
+    logger.info(f"Merged {len(partials)} partial extraction(s); {len(conflicts)} field(s) conflict.")
+    return merged, conflicts
@@ -0,0 +1,205 @@
+import re
+import logging
+from typing import List, Optional, Tuple
+from utils.constants import ComparisonConstants
+from utils.prompts import RentalAgreement
+
+logger = logging.getLogger(__name__)
+
+# Fields compared term by term; CriticalTerms are context only.
+COMPARED_FIELDS = [name for name in RentalAgreement.model_fields if name != "CriticalTerms"]
+FIELD_LABELS = {name: re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name) for name in COMPARED_FIELDS}
+
+AMOUNT_FIELDS = {"RentalAmount", "SecurityDeposit"}
+DURATION_FIELDS = {"LeaseDuration", "NoticePeriod"}
+
+_MULTIPLIERS = {
+    "k": 1e3, "thousand": 1e3, "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7, "m": 1e6, "mn": 1e6, "million": 1e6,
+}
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "fifteen": 15, "eighteen": 18, "twenty": 20, "thirty": 30, "sixty": 60, "ninety": 90,
+}
+_UNIT_MONTHS = {"year": 12.0, "month": 1.0, "week": 12 / 52, "day": 12 / 365}
+_AMOUNT_PATTERN = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(" + "|".join(_MULTIPLIERS) + r")?\b")
+_DURATION_PATTERN = re.compile(
+    r"\b(\d+(?:\.\d+)?|" + "|".join(_NUMBER_WORDS) + r")[\s-]*(year|yr|month|mo|week|wk|day)s?\b"
+)
+_MONTHLY = re.compile(r"(?<![a-z])(per month|monthly|a month|p\.?\s?m\.?|/\s?month|/\s?mo)(?![a-z])")
+_YEARLY = re.compile(r"(?<![a-z])(per annum|per year|annual(?:ly)?|yearly|a year|p\.?\s?a\.?|/\s?year|/\s?yr)(?![a-z])")
+_CURRENCIES = {
+    "₹": "INR", "inr": "INR", "rs": "INR", "rupee": "INR", "rupees": "INR",
+    "$": "USD", "usd": "USD", "dollar": "USD", "dollars": "USD",
+    "€": "EUR", "eur": "EUR", "euro": "EUR", "euros": "EUR",
+    "£": "GBP", "gbp": "GBP", "pound": "GBP", "pounds": "GBP",
+}
+_CURRENCY_PATTERN = re.compile(r"[₹$€£]|(?<![a-z])(?:inr|rs|rupees?|usd|dollars?|eur|euros?|gbp|pounds?)(?![a-z])")
+# Placeholders a model writes for a term the agreement does not state.
+EMPTY_VALUES = {
+    "", "-", "n/a", "na", "none", "nil", "null", "unknown", "not found", "not specified",
+    "not mentioned", "not available", "not applicable", "not provided", "not stated",
+}
+# Words that only join the parts of an amount or duration ("1 year and 6 months", "Rs. 25,000/- only").
+_FILLER_WORDS = {"and", "only"}
+
+
+def normalize_text(value) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", str(value or "")).strip().lower()
+    return text.rstrip(" .;,")
+
+
+def is_empty_value(value) -> bool:
+    """Return True for placeholder values that mean a term is not stated."""
+    return normalize_text(value) in EMPTY_VALUES
+
+
+def parse_amount(value) -> Optional[Tuple[float, Optional[str]]]:
+    """Parse a money string into ``(amount, period)``, e.g. "Rs. 25,000/- per month"."""
+    text = normalize_text(value)
+    match = _AMOUNT_PATTERN.search(text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", "")) * _MULTIPLIERS.get(match.group(2) or "", 1)
+    period = "month" if _MONTHLY.search(text) else "year" if _YEARLY.search(text) else None
+    return amount, period
+
+
+def parse_duration_months(value) -> Optional[float]:
+    """Parse a duration such as "1 year and 6 months" or "thirty days" into months."""
+    text = normalize_text(value)
+    total, found = 0.0, False
+    for number, unit in _DURATION_PATTERN.findall(text):
+        quantity = float(_NUMBER_WORDS.get(number, number))
+        unit = {"yr": "year", "mo": "month", "wk": "week"}.get(unit, unit)
+        total += quantity * _UNIT_MONTHS[unit]
+        found = True
+    return round(total, 2) if found else None
+
+
+def currencies(value) -> frozenset:
+    """Return the currency codes mentioned in a money string."""
+    return frozenset(_CURRENCIES[match] for match in _CURRENCY_PATTERN.findall(normalize_text(value)))
+
+
+def _residual_text(text: str, patterns) -> str:
+    """Return what a value says besides the parts matched by ``patterns``, normalized for comparison."""
+    for pattern in patterns:
+        text = pattern.sub(" ", text)
+    words = re.sub(r"[^\w%]+", " ", text).split()
+    return " ".join(word for word in words if word not in _FILLER_WORDS)
+
+
+def _amount_terms(value) -> Optional[tuple]:
+    """Return ``(amount, period, currencies, residual)`` of a value stating a single amount, else None."""
+    text = normalize_text(value)
+    if len(_AMOUNT_PATTERN.findall(text)) != 1:
+        return None
+    amount, period = parse_amount(text)
+    return amount, period, currencies(text), _residual_text(text, [_AMOUNT_PATTERN, _CURRENCY_PATTERN, _MONTHLY, _YEARLY])
+
+
+def _duration_terms(value) -> Optional[tuple]:
+    """Return ``(months, residual)`` of a value stating a duration, else None."""
+    text = normalize_text(value)
+    months = parse_duration_months(text)
+    return None if months is None else (months, _residual_text(text, [_DURATION_PATTERN]))
+
+
+def match_field(field: str, value1, value2) -> Optional[str]:
+    """Return "exact" or "equivalent" if both values agree locally, else None.
+
+    Values are only "equivalent" when they state nothing but the same amount
+    (in the same currency and period) or duration in different formats; any
+    other wording, such as "refundable" or "renewable", is left to the model.
+    A term either agreement does not state never matches.
+    """
+    if is_empty_value(value1) or is_empty_value(value2):
+        return None
+    if normalize_text(value1) == normalize_text(value2):
+        return "exact"
+    if field in AMOUNT_FIELDS:
+        terms1, terms2 = _amount_terms(value1), _amount_terms(value2)
+        if terms1 and terms2 and abs(terms1[0] - terms2[0]) < 0.005 and terms1[1:] == terms2[1:]:
+            return "equivalent"
+    elif field in DURATION_FIELDS:
+        terms1, terms2 = _duration_terms(value1), _duration_terms(value2)
+        if terms1 and terms1 == terms2:
+            return "equivalent"
+    return None
+
+
+def pre_diff(doc1: dict, doc2: dict) -> Tuple[List[dict], List[str]]:
+    """Decide matching fields locally.
+
+    Returns the report entries for fields that match, and the names of the
+    fields that truly differ and still need the model's judgement.
+    """
+    local_entries, differing = [], []
+    for field in COMPARED_FIELDS:
+        value1, value2 = doc1.get(field, ""), doc2.get(field, "")
+        match = match_field(field, value1, value2)
+        if match is None:
+            differing.append(field)
+            continue
+        local_entries.append({
+            "KeyTerm": FIELD_LABELS[field],
+            "Document-1": str(value1),
+            "Document-2": str(value2),
+            "Mismatch/Comment": "Match" if match == "exact" else "Equivalent (formatting differs only)",
+            "Inference": "Both agreements state the same term, so there is no legal, financial or practical difference.",
+        })
+    logger.info(f"Local pre-diff matched {len(local_entries)} field(s); {len(differing)} differ.")
+    return local_entries, differing
+
+
+def compact_critical_terms(terms: List[dict], max_terms: int = ComparisonConstants.MAX_CRITICAL_TERMS,
+                           max_chars: int = ComparisonConstants.MAX_TERM_DETAIL_CHARS) -> List[dict]:
+    """Return a document's CriticalTerms de-duplicated, capped and with long details truncated.
+
+    They are only context for the compared fields, so the model's own
+    inferences are left out.
+    """
+    compact, seen = [], set()
+    for term in terms or []:
+        key = normalize_text(term.get("FlaggedTerm"))
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        details = re.sub(r"\s+", " ", str(term.get("Details", ""))).strip()
+        if len(details) > max_chars:
+            details = details[:max_chars].rsplit(" ", 1)[0] + "..."
+        compact.append({"FlaggedTerm": term["FlaggedTerm"], "Details": details})
+        if len(compact) == max_terms:
+            break
+    return compact
+
+
+def comparison_payload(doc: dict, fields: List[str]) -> dict:
+    """Return the fields the model must compare, with the document's compacted CriticalTerms as context."""
+    return {**{field: doc.get(field, "") for field in fields}, "CriticalTerms": compact_critical_terms(doc.get("CriticalTerms"))}
+
+
+def _field_for_key_term(key_term: str) -> Optional[str]:
+    """Map a model-written KeyTerm (e.g. "Notice Period") back to its field name."""
+    key = re.sub(r"[^a-z]", "", key_term.lower())
+    for field in COMPARED_FIELDS:
+        if key == field.lower():
+            return field
+    return None
+
+
+def label_entry(entry: dict) -> dict:
+    """Return a model-written entry with its KeyTerm replaced by the canonical field label."""
+    field = _field_for_key_term(entry.get("KeyTerm", ""))
+    return {**entry, "KeyTerm": FIELD_LABELS[field]} if field else entry
+
+
+def merge_report(local_entries: List[dict], llm_entries: List[dict]) -> dict:
+    """Merge local and model entries into one ComparisonReport ordered by schema field."""
+    order = {FIELD_LABELS[field]: index for index, field in enumerate(COMPARED_FIELDS)}
+    entries = list(local_entries) + [label_entry(entry) for entry in llm_entries]
+    entries.sort(key=lambda entry: order.get(entry["KeyTerm"], len(order)))
+    return {"ComparisonReport": entries}
@@ -1,16 +1,33 @@
 import asyncio
-import fitz  # PyMuPDF
 import json
 import os
 import logging
-from docx2pdf import convert
+import sqlite3
+import time
 from dotenv import load_dotenv
-from openai import AsyncOpenAI
 from os.path import join, dirname
-from utils.prompts import SYSTEM_PROMPT, EXTRACT_FORMAT, COMPARE_FORMAT, RentalAgreement, ComparisonReport
-from typing import List
+from utils.prompts import (
+    SYSTEM_PROMPT, EXTRACT_FORMAT, COMPARE_FORMAT, PARTIAL_COMPARE_NOTE, PARTIAL_EXTRACT_NOTE, RECONCILE_FORMAT,
+    TEMPLATE_EXTRACT_NOTE, PORTFOLIO_EXPLAIN_FORMAT, RentalAgreement, PartialRentalAgreement, ComparisonReport, ReconciledFields, PortfolioExplanation,
+)
+from typing import AsyncIterator, Callable, List, Optional, Union
 from pydantic import BaseModel
-from utils.utils import TempFolderManager, FileHandler
+from services.chunking import merge_critical_terms, merge_partial_agreements, page_windows
+from services.comparison import COMPARED_FIELDS, comparison_payload, is_empty_value, label_entry, pre_diff, merge_report
+from services.docx_reader import DocxConverter, is_docx, read_docx_paragraphs, split_text_pages
+from services.llm_client import LLMClient, estimate_image_tokens
+from services.payload import ImageURL, fit_images
+from services.page_renderer import PagePolicy, PageRenderPool, estimate_document_tokens
+from services.portfolio import PortfolioIndex, scores_to_records
+from services.template_index import TemplateIndex, TemplateMatch
+from utils.cache import ResultCache, hash_bytes, hash_json
+from utils.json_stream import IncrementalJSONParser, JSONStreamEvent
+from utils.telemetry import Telemetry, current_document
+from utils.workspace import get_workspace
+from utils.constants import (
+    OpenAIConstants, CacheConstants, DocumentProcessorConstants, DocxConstants, PayloadConstants, PortfolioConstants,
+    TemplateConstants,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -20,127 +37,491 @@ logger = logging.getLogger(__name__)
 class DocumentProcessor:
     """Process documents to extract text and images or compare them."""
 
-    def __init__(self):
-        self.temp_manager = TempFolderManager()
+    def __init__(self, telemetry: Optional[Telemetry] = None):
+        self.telemetry = telemetry or Telemetry()
+        self.workspace = get_workspace(DocumentProcessorConstants.PROCESSED_FILES, telemetry=self.telemetry)
         dotenv_path = join(dirname(__file__), '.env')
         load_dotenv(dotenv_path)
         self.api_key = os.environ.get("OPEN_AI_API_KEY")  # add constants
+        self.model_params = {
+            "model": OpenAIConstants.MODEL,
+            "temperature": OpenAIConstants.TEMPERATURE,
+            "max_tokens": OpenAIConstants.MAX_TOKENS,
+            "frequency_penalty": OpenAIConstants.FREQUENCY_PENALTY,
+            "presence_penalty": OpenAIConstants.PRESENCE_PENALTY,
+        }
+        self.extraction_cache = ResultCache(
+            cache_dir=CacheConstants.EXTRACTION_CACHE_DIR,
+            max_entries=CacheConstants.MEMORY_MAX_ENTRIES,
+            max_disk_bytes=CacheConstants.DISK_MAX_BYTES,
+            ttl_seconds=CacheConstants.DISK_TTL_SECONDS,
+        )
+        self.max_concurrency = DocumentProcessorConstants.MAX_CONCURRENT_EXTRACTIONS
+        self.page_policy = PagePolicy()
+        self.chunk_pages = DocumentProcessorConstants.CHUNK_PAGES
+        self.docx_converter = DocxConverter()
+        self.render_pool = PageRenderPool(max_workers=DocumentProcessorConstants.RENDER_WORKERS)
+        self.max_request_bytes = PayloadConstants.MAX_REQUEST_BYTES
+        self.llm_client = LLMClient(api_key=self.api_key, max_request_bytes=self.max_request_bytes)
+        self.template_index = TemplateIndex(TemplateConstants.INDEX_PATH) if TemplateConstants.ENABLED else None
+
+    async def extract_text_and_images(self, pdf_data: bytes = None, pdf_file: str = None,
+                                      on_event: Optional[Callable[[JSONStreamEvent], None]] = None) -> dict:
+        """Extract data from PDF binary or file, reusing cached results for identical input.
 
-    async def extract_text_and_images(self, pdf_data: bytes = None, pdf_file: str = None) -> dict:
-        """Extract data from PDF binary or file."""
+        With ``on_event``, single-call extractions are streamed and each field is
+        reported as soon as the model has written it.
+        """
         logger.info("Starting data extraction.")
-        temp_folders = set()
+        cache_key = self._extraction_cache_key(pdf_data, pdf_file)
+        document_token = current_document.set(cache_key[:16])
+        try:
+            with self.telemetry.span("extract"):
+                cached = self.extraction_cache.get(cache_key)
+                self.telemetry.increment("extraction_cache_total", result="hit" if cached is not None else "miss")
+                if cached is not None:
+                    logger.info("Extraction cache hit.")
+                    return cached
+
+                result = await self._extract(pdf_data, pdf_file, on_event=on_event)
+                if result:
+                    self.extraction_cache.set(cache_key, result)
+                return result
+        finally:
+            current_document.reset(document_token)
+
+    def extract_stream(self, pdf_data: bytes = None, pdf_file: str = None) -> AsyncIterator[dict]:
+        """Extract a document, yielding fields as they are completed.
+
+        Yields ``{"type": "field", "key", "value"}`` for each completed field and
+        ``{"type": "item", "key", "index", "value"}`` for each completed
+        CriticalTerms entry, then ``{"type": "result", "value"}`` with the final
+        extraction validated against RentalAgreement. Cache hits, long documents
+        and templated documents only yield the result.
+        """
+        return self._stream_events(lambda on_event: self.extract_text_and_images(pdf_data, pdf_file, on_event=on_event))
+
+    def compare_stream(self, doc1: dict, doc2: dict) -> AsyncIterator[dict]:
+        """Compare two documents, yielding each ComparisonReport row as soon as it is decided.
 
+        Locally matched rows come first, then the model's rows as they are
+        streamed; the last event is the merged, validated report.
+        """
+        return self._stream_events(lambda on_event: self.compare_documents(doc1, doc2, on_event=on_event))
+
+    async def _stream_events(self, run: Callable) -> AsyncIterator[dict]:
+        """Run ``run(on_event)`` in a task and yield its events, then its result."""
+        events = asyncio.Queue()
+        task = asyncio.create_task(run(events.put_nowait))
         try:
+            while True:
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                event = getter.result()
+                yield {"type": event.kind, "key": event.key, "index": event.index, "value": event.value}
+            while not events.empty():
+                event = events.get_nowait()
+                yield {"type": event.kind, "key": event.key, "index": event.index, "value": event.value}
+            yield {"type": "result", "value": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def extract_many(self, documents: List[Union[bytes, str]], max_concurrency: Optional[int] = None) -> list:
+        """Extract several documents concurrently.
+
+        Each document is either PDF bytes or a file path. Results are returned in
+        input order; a document that fails yields its exception instead of a dict,
+        so one bad upload does not abort the others.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def extract_one(index: int, document: Union[bytes, str]) -> dict:
+            async with semaphore:
+                logger.info(f"Extracting document {index + 1} of {len(documents)}.")
+                if isinstance(document, (bytes, bytearray)):
+                    return await self.extract_text_and_images(pdf_data=bytes(document))
+                return await self.extract_text_and_images(pdf_file=document)
+
+        results = await asyncio.gather(
+            *(extract_one(index, document) for index, document in enumerate(documents)),
+            return_exceptions=True,
+        )
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f"Extraction failed for document {index + 1}: {result}")
+        return results
+
+    def close(self):
+        """Release background resources such as the page rendering pool, the API connection pool and the template index."""
+        self.render_pool.shutdown()
+        self.llm_client.close()
+        if self.template_index is not None:
+            self.template_index.close()
+
+    def workspace_stats(self) -> dict:
+        """Return disk usage and eviction counters for the scratch workspace."""
+        return self.workspace.stats()
+
+    def cache_stats(self) -> dict:
+        """Return hit/miss counters for the extraction cache."""
+        return self.extraction_cache.stats()
+
+    def _extraction_cache_key(self, pdf_data: bytes = None, pdf_file: str = None) -> str:
+        """Build a cache key from the input bytes, prompt/schema version and model parameters."""
+        if pdf_data:
+            content_hash = hash_bytes(pdf_data)
+        elif pdf_file:
+            with open(pdf_file, "rb") as file:
+                content_hash = hash_bytes(file.read())
+        else:
+            raise ValueError("Either pdf_data or pdf_file must be provided.")
+        # The file type decides how the content is rendered, so it is part of the key.
+        extension = ".pdf" if pdf_data else os.path.splitext(pdf_file)[1].lower()
+        return hash_json({
+            "content": content_hash,
+            "type": extension,
+            "prompt": [SYSTEM_PROMPT, EXTRACT_FORMAT],
+            "schema": [RentalAgreement.model_json_schema(), PartialRentalAgreement.model_json_schema()],
+            "model": self.model_params,
+            "page_policy": self.page_policy.fingerprint(),
+            "chunk_pages": self.chunk_pages,
+            "chunk_prompt": [PARTIAL_EXTRACT_NOTE, RECONCILE_FORMAT, TEMPLATE_EXTRACT_NOTE],
+            "docx_page_chars": DocxConstants.PAGE_CHARS,
+            "max_request_bytes": self.max_request_bytes,
+        })
+
+    def comparison_cache_key(self, doc1: dict, doc2: dict) -> str:
+        """Build an order-aware cache key for comparing ``doc1`` against ``doc2``."""
+        return hash_json({
+            "doc1": hash_json(doc1),
+            "doc2": hash_json(doc2),
+            "prompt": [SYSTEM_PROMPT, COMPARE_FORMAT, PARTIAL_COMPARE_NOTE],
+            "schema": ComparisonReport.model_json_schema(),
+            "model": self.model_params,
+        })
+
+    async def _extract(self, pdf_data: bytes = None, pdf_file: str = None,
+                       on_event: Optional[Callable[[JSONStreamEvent], None]] = None) -> dict:
+        """Run the full extraction pipeline without consulting the cache."""
+        with self.telemetry.span("render"):
             if pdf_data:
                 logger.info("Extracting data from binary input.")
-                page_text, images = await self._extract_from_binary(pdf_data)
+                pages = await self._extract_from_binary(pdf_data)
             elif pdf_file:
                 logger.info(f"Extracting data from file: {pdf_file}")
-                page_text, images = await self._extract_from_file(pdf_file)
+                pages = await self._extract_from_file(pdf_file)
             else:
                 raise ValueError("Either pdf_data or pdf_file must be provided.")
 
-            for image_path in images:
-                temp_folders.add(os.path.dirname(image_path))
+        page_texts = [page["text"] for page in pages]
+        if self.template_index is not None:
+            with self.telemetry.span("template_match"):
+                match = self.template_index.match(page_texts)
+            if match and len(match.differing_pages) <= self.chunk_pages:
+                return await self._extract_with_template(pages, match)
 
-            content = self._prepare_extraction_messages(images, page_text)
-            return await self._get_openai_response(content, RentalAgreement)
+        if len(pages) > self.chunk_pages:
+            result = await self._extract_chunked(pages)
+        else:
+            with self.telemetry.span("build_payload"):
+                page_text, images = self._join_pages(pages)
+                content = self._prepare_extraction_messages(images, page_text)
+            result = await self._get_openai_response(content, RentalAgreement, operation="extract", on_event=on_event)
+        await self._remember_template(page_texts, result)
+        return result
 
-        finally:
-            for folder in temp_folders:
-                self.temp_manager.delete_temp_folder(folder)
+    async def _extract_with_template(self, pages: List[dict], match: TemplateMatch) -> dict:
+        """Extract only the pages that differ from a known template, reusing its extraction for the rest."""
+        self.telemetry.increment("template_pages_skipped_total", len(match.identical_pages))
+        if not match.differing_pages:
+            # The template may be a merged extraction that leaves a field unknown.
+            return PartialRentalAgreement(**{**match.extraction, "CriticalTerms": match.identical_page_terms}).dict(by_alias=True)
+
+        with self.telemetry.span("build_payload"):
+            page_text, images = self._join_pages([pages[index] for index in match.differing_pages])
+            note = TEMPLATE_EXTRACT_NOTE.format(
+                pages=", ".join(str(index + 1) for index in match.differing_pages),
+                page_count=len(pages),
+                template=json.dumps(
+                    {field: match.extraction.get(field, "") for field in COMPARED_FIELDS},
+                    separators=(",", ":"), ensure_ascii=False,
+                ),
+            )
+            content = self._prepare_extraction_messages(images, page_text, note=note)
+        response = await self._get_openai_response(content, RentalAgreement, operation="extract_template")
+        for field in COMPARED_FIELDS:
+            if is_empty_value(response.get(field)):
+                response[field] = match.extraction.get(field, "")
+        # Terms on the identical pages come from the template; the model only reports the new pages' terms.
+        response["CriticalTerms"] = merge_critical_terms([match.identical_page_terms, response.get("CriticalTerms", [])])
+        return RentalAgreement(**response).dict(by_alias=True)
+
+    async def _remember_template(self, page_texts: List[str], extraction: dict):
+        """Index a freshly extracted document so later documents built from it can reuse its extraction."""
+        if self.template_index is None or not extraction:
+            return
+        template_id = hash_json(page_texts)
+
+        try:
+            await asyncio.to_thread(self.template_index.add, template_id, page_texts, extraction)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Could not persist the template index: {e}")
+
+    async def _extract_chunked(self, pages: List[dict]) -> dict:
+        """Map-reduce extraction for long documents.
+
+        Each page window is extracted concurrently, the partial results are
+        merged locally, and a small reconcile call resolves conflicting fields.
+        """
+        windows = page_windows(pages, self.chunk_pages)
+        logger.info(f"Extracting {len(pages)} pages in {len(windows)} windows of up to {self.chunk_pages} pages.")
+        labels = [f"pages {start + 1}-{start + len(window)}" for start, window in windows]
+
+        async def extract_window(start: int, window: List[dict]) -> dict:
+            page_text, images = self._join_pages(window)
+            note = PARTIAL_EXTRACT_NOTE.format(first_page=start + 1, last_page=start + len(window), page_count=len(pages))
+            with self.telemetry.span("build_payload"):
+                content = self._prepare_extraction_messages(images, page_text, note=note)
+            return await self._get_openai_response(content, PartialRentalAgreement, operation="extract_window")
+
+        partials = await asyncio.gather(*(extract_window(start, window) for start, window in windows))
+        with self.telemetry.span("merge"):
+            merged, conflicts = merge_partial_agreements(partials, labels)
+        if conflicts:
+            merged.update(await self._reconcile_fields(conflicts))
+        return PartialRentalAgreement(**merged).dict(by_alias=True)
 
-    async def compare_documents(self, doc1: dict, doc2: dict) -> dict:
-        """Compare two documents and generate a comparison report."""
+    async def _reconcile_fields(self, conflicts: dict) -> dict:
+        """Ask the model to pick one value for each conflicting field."""
+        logger.info(f"Reconciling conflicting fields: {', '.join(conflicts)}.")
+        messages = [
+            {"type": "text", "role": "system", "content": SYSTEM_PROMPT},
+            {"type": "text", "role": "user", "content": f"Conflicting fields:\n {json.dumps(conflicts, separators=(',', ':'), ensure_ascii=False)}"},
+            {"type": "text", "role": "user", "content": RECONCILE_FORMAT},
+        ]
+        response = await self._get_openai_response(messages, ReconciledFields, operation="reconcile")
+        resolved = {}
+        for entry in response["Fields"]:
+            if entry["Field"] not in conflicts:
+                continue
+            if entry["Field"] == "UtilitiesResponsibility" and entry["Value"] not in ("Tenant", "Owner"):
+                continue
+            resolved[entry["Field"]] = entry["Value"]
+        return resolved
+
+    @staticmethod
+    def _join_pages(pages: List[dict]) -> tuple:
+        """Return the concatenated text and the page images of rendered pages."""
+        page_text = "".join(page["text"] for page in pages)
+        images = [page["image"] for page in pages if page["image"]]
+        return page_text, images
+
+    async def compare_documents(self, doc1: dict, doc2: dict,
+                                on_event: Optional[Callable[[JSONStreamEvent], None]] = None) -> dict:
+        """Compare two documents and generate a comparison report.
+
+        Matching fields are decided locally; only fields that truly differ are
+        sent to the model, and both parts are merged into one report. With
+        ``on_event``, every row is reported as soon as it is decided.
+        """
         logger.info("Starting document comparison.")
-        comparison_messages = self._prepare_comparison_messages(doc1, doc2)
-        return await self._get_openai_response(comparison_messages, ComparisonReport)
-
-    async def _extract_from_binary(self, pdf_data: bytes) -> tuple:
-        """Extract text and images from binary PDF data."""
-        temp_folder = self.temp_manager.create_temp_folder()
-        temp_pdf_path = FileHandler.save_file(temp_folder, "temp_input.pdf", pdf_data)
-        return await self._extract_from_file(temp_pdf_path)
-
-    async def _extract_from_file(self, file_path: str) -> tuple:
-        """Extract text and images from a PDF or Word file."""
-        temp_folder = self.temp_manager.create_temp_folder()
-        if file_path.endswith('.docx'):
-            logger.info("Converting Word document to PDF.")
-            temp_pdf_path = os.path.join(temp_folder, "converted.pdf")
-            convert(file_path, temp_pdf_path)
-            file_path = temp_pdf_path
-        return await self._extract_from_pdf(file_path)
-
-    async def _extract_from_pdf(self, pdf_file: str) -> tuple:
-        """Extract text and images from a PDF file."""
-        document = fitz.open(pdf_file)
-        images, extracted_text = [], ""
-        temp_folder = self.temp_manager.create_temp_folder()
-
-        for page_num in range(len(document)):
-            page = document.load_page(page_num)
-            extracted_text += page.get_text()
-            temp_img_path = os.path.join(temp_folder, f"page_{page_num + 1}.png")
-            page.get_pixmap().save(temp_img_path)
-            images.append(temp_img_path)
-
-        return extracted_text, images
-
-    def _prepare_extraction_messages(self, images: List[str], page_text: str) -> List[dict]:
-        """Prepare messages for text and image extraction."""
-        messages = [{"type": "text", "role": "system", "content": SYSTEM_PROMPT}]
-        for image in images:
-            base64_image = FileHandler.encode_image_to_base64(image)
+        with self.telemetry.span("compare"):
+            with self.telemetry.span("pre_diff"):
+                local_entries, differing = pre_diff(doc1, doc2)
+            self.telemetry.increment("comparison_fields_total", len(local_entries), decided_by="local")
+            self.telemetry.increment("comparison_fields_total", len(differing), decided_by="llm")
+            row_event = None
+            if on_event is not None:
+                for index, entry in enumerate(local_entries):
+                    on_event(JSONStreamEvent("item", "ComparisonReport", entry, index))
+
+                def row_event(event: JSONStreamEvent):
+                    if event.kind == "item" and event.key == "ComparisonReport":
+                        on_event(event._replace(value=label_entry(event.value), index=len(local_entries) + event.index))
+            if not differing:
+                return merge_report(local_entries, [])
+
+            with self.telemetry.span("build_payload"):
+                comparison_messages = self._prepare_comparison_messages(
+                    comparison_payload(doc1, differing), comparison_payload(doc2, differing), partial=bool(local_entries),
+                )
+            response = await self._get_openai_response(
+                comparison_messages, ComparisonReport, operation="compare", on_event=row_event,
+            )
+            return merge_report(local_entries, response["ComparisonReport"])
+
+    async def compare_to_portfolio(self, agreement: dict, portfolio: PortfolioIndex,
+                                   top_k: int = PortfolioConstants.TOP_K) -> dict:
+        """Compare one agreement against a whole portfolio.
+
+        Deviations, outliers and percentile ranks are computed locally in one
+        vectorized pass; the model is only asked to explain the ``top_k`` most
+        anomalous fields, and is not called at all if nothing stands out.
+        """
+        logger.info(f"Comparing agreement against a portfolio of {len(portfolio)}.")
+        with self.telemetry.span("portfolio_compare"):
+            with self.telemetry.span("portfolio_score"):
+                scores = portfolio.score(agreement)
+                anomalies = portfolio.top_anomalies(scores, top_k)
+            report = {"PortfolioSize": len(portfolio), "Fields": scores_to_records(scores), "Explanations": []}
+            if anomalies.empty:
+                return report
+
+            with self.telemetry.span("build_payload"):
+                messages = self._prepare_portfolio_messages(agreement, scores_to_records(anomalies))
+            response = await self._get_openai_response(messages, PortfolioExplanation, operation="portfolio_explain")
+            report["Explanations"] = [entry for entry in response["Explanations"] if entry["Feature"] in anomalies.index]
+            return report
+
+    async def _extract_from_binary(self, pdf_data: bytes) -> List[dict]:
+        """Extract the rendered pages of binary PDF (or Word) data."""
+        if is_docx(pdf_data):
+            return await self._extract_from_docx(pdf_data)
+        return await self._extract_from_pdf(pdf_data)
+
+    async def _extract_from_file(self, file_path: str) -> List[dict]:
+        """Extract the rendered pages of a PDF or Word file."""
+        with open(file_path, "rb") as file:
+            data = file.read()
+        return await self._extract_from_binary(data)
+
+    async def _extract_from_docx(self, docx_data: bytes) -> List[dict]:
+        """Read a Word document natively, rendering it only if it has no usable text."""
+        blocks = read_docx_paragraphs(docx_data)
+        if self.page_policy.has_text_layer("\n".join(blocks)):
+            logger.info("Using native Word document text; no page images needed.")
+            return split_text_pages(blocks)
+        logger.info("Word document has little text; rendering it to PDF.")
+        pdf_data = await asyncio.to_thread(self.docx_converter.convert, docx_data)
+        return await self._extract_from_pdf(pdf_data)
+
+    async def _extract_from_pdf(self, pdf_data: bytes) -> List[dict]:
+        """Render the pages of in-memory PDF data, as decided by the page policy."""
+        pages = await self.render_pool.render(pdf_data, self.page_policy)
+        images = [page["image"] for page in pages if page["image"]]
+
+        logger.info(
+            f"Prepared {len(images)} page image(s) for {len(pages)} page(s), "
+            f"estimated image tokens: {estimate_document_tokens(images)}."
+        )
+        return pages
+
+    def _prepare_extraction_messages(self, images: List[dict], page_text: str, note: str = "") -> List[dict]:
+        """Prepare messages for text and image extraction.
+
+        Page images are referenced as raw bytes and only base64-encoded while the
+        request body is sent; images that would push the request over the byte
+        budget are dropped or downscaled first.
+        """
+        text_messages = [
+            {"type": "text", "role": "system", "content": SYSTEM_PROMPT},
+            {"type": "text", "role": "user", "content": f"META DATA: Use this Text Parsed from Document for your Response:\n\n {page_text}"},
+            {"type": "text", "role": "user", "content": EXTRACT_FORMAT + note},
+        ]
+        other_bytes = PayloadConstants.BODY_OVERHEAD_BYTES + sum(len(message["content"].encode("utf-8")) for message in text_messages)
+        fitted = fit_images(images, other_bytes, self.max_request_bytes)
+        if fitted.dropped:
+            self.telemetry.increment("payload_images_total", fitted.dropped, action="dropped")
+        if fitted.downscaled:
+            self.telemetry.increment("payload_images_total", fitted.downscaled, action="downscaled")
+
+        messages = text_messages[:1]
+        for image in fitted.images:
             messages.append(
                 {
-                    "type": "image_url",
                     "role": "user",
-                    "content": "parse Image",
-                    "image_url": {"url": f"data:image/jpeg;base64,{base64_image}", "detail": "high"},
+                    "content": [
+                        {"type": "text", "text": "parse Image"},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": ImageURL(image["data"], image["mime"], image["width"], image["height"]),
+                                "detail": image["detail"],
+                            },
+                        },
+                    ],
                 }
             )
-        messages.append(
-            {"type": "text", "role": "user", "content": f"META DATA: Use this Text Parsed from Document for your Response:\n\n {page_text}"}
-        )
-        messages.append({"type": "text", "role": "user", "content": EXTRACT_FORMAT})
+        messages.extend(text_messages[1:])
         return messages
 
-    def _prepare_comparison_messages(self, doc1: dict, doc2: dict) -> List[dict]:
-        """Prepare messages for document comparison."""
+    def _prepare_comparison_messages(self, doc1: dict, doc2: dict, partial: bool = False) -> List[dict]:
+        """Prepare messages for document comparison, with compact JSON payloads."""
         messages = [
             {"type": "text", "role": "system", "content": SYSTEM_PROMPT + "\nYou are a smart agreement comparer for generating a subjective comparison report in JSON."},
-            {"type": "text", "role": "user", "content": f"Document-1 Data:\n {json.dumps(doc1, indent=2)}"},
-            {"type": "text", "role": "user", "content": f"Document-2 Data:\n {json.dumps(doc2, indent=2)}"},
-            {"type": "text", "role": "user", "content": COMPARE_FORMAT},
+            {"type": "text", "role": "user", "content": f"Document-1 Data:\n {json.dumps(doc1, separators=(',', ':'), ensure_ascii=False)}"},
+            {"type": "text", "role": "user", "content": f"Document-2 Data:\n {json.dumps(doc2, separators=(',', ':'), ensure_ascii=False)}"},
+            {"type": "text", "role": "user", "content": COMPARE_FORMAT + (PARTIAL_COMPARE_NOTE if partial else "")},
         ]
         return messages
 
-    async def _get_openai_response(self, content: List[dict], format: BaseModel) -> dict:
-        """Get response from OpenAI's API."""
+    def _prepare_portfolio_messages(self, agreement: dict, anomalies: List[dict]) -> List[dict]:
+        """Prepare messages asking the model to explain anomalous fields against the portfolio."""
+        messages = [
+            {"type": "text", "role": "system", "content": SYSTEM_PROMPT},
+            {"type": "text", "role": "user", "content": f"New Agreement Data:\n {json.dumps(agreement, separators=(',', ':'), ensure_ascii=False)}"},
+            {"type": "text", "role": "user", "content": f"Anomalous Features:\n {json.dumps(anomalies, separators=(',', ':'), ensure_ascii=False)}"},
+            {"type": "text", "role": "user", "content": PORTFOLIO_EXPLAIN_FORMAT},
+        ]
+        return messages
+
+    async def _get_openai_response(self, content: List[dict], format: BaseModel, operation: str = "extract",
+                                   on_event: Optional[Callable[[JSONStreamEvent], None]] = None) -> dict:
+        """Get response from OpenAI's API, recording latency, token usage and payload size.
+
+        With ``on_event`` the response is streamed and completed fields are
+        reported as they arrive; the returned dict is validated either way.
+        """
         logger.info("Sending request to OpenAI API.")
-        client = AsyncOpenAI(api_key=self.api_key)
-        temperature = 0.0125
-        maxtokens = 2000
-        fpenalty = 0.007
-        presencepenalty = 0.007
-        response = await client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            response_format=format,
-            messages=content,
-            temperature=temperature,
-            max_tokens=maxtokens,
-            frequency_penalty=fpenalty,
-            presence_penalty=presencepenalty,
+        started = time.perf_counter()
+        with self.telemetry.span("api_call", operation=operation):
+            if on_event is None:
+                response = await self.llm_client.parse(content, format, **self.model_params)
+            else:
+                response = await self._stream_openai_response(content, format, operation, on_event)
+        usage = response.usage
+        self.telemetry.record_llm_call(
+            operation=operation,
+            duration_seconds=time.perf_counter() - started,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+            image_tokens=estimate_image_tokens(content),
+            payload_bytes=self.llm_client.request_bytes(content, format, stream=on_event is not None, **self.model_params),
         )
-        try:
-            final_response = response.choices[0].message.parsed
-            logger.info("Received response from OpenAI API.")
-            return final_response.dict(by_alias=True)
-        except Exception as e:
-            logger.error(f"Error parsing response: {e}")
-            return {}
+        message = response.choices[0].message
+        if message.parsed is None:
+            logger.error(f"Error parsing response: {message.refusal or 'empty structured output'}")
+            raise ValueError(f"OpenAI response could not be parsed: {message.refusal or 'empty structured output'}")
+        logger.info("Received response from OpenAI API.")
+        return message.parsed.dict(by_alias=True)
+
+    async def _stream_openai_response(self, content: List[dict], format: BaseModel, operation: str,
+                                      on_event: Callable[[JSONStreamEvent], None]):
+        """Stream a completion, reporting completed fields, and return the final parsed completion."""
+        parser = IncrementalJSONParser()
+        started = time.perf_counter()
+        first_event = True
+        async for chunk in self.llm_client.stream_parse(content, format, **self.model_params):
+            if chunk.completion is not None:
+                return chunk.completion
+            if parser is None:
+                continue
+            try:
+                events = parser.feed(chunk.delta)
+            except ValueError as e:
+                # Partial output is only a preview; the final completion is still validated.
+                logger.warning(f"Stopped previewing streamed output: {e}")
+                parser = None
+                continue
+            for event in events:
+                if first_event:
+                    self.telemetry.record_span("time_to_first_field", time.perf_counter() - started, operation=operation)
+                    first_event = False
+                on_event(event)
 
 # Example Usage
 if __name__ == "__main__":
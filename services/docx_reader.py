@@ -0,0 +1,155 @@
+import io
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+import xml.etree.ElementTree as ElementTree
+from typing import List, Optional
+from utils.cache import ResultCache, hash_bytes
+from utils.constants import DocxConstants
+from utils.utils import TempFolderManager
+
+logger = logging.getLogger(__name__)
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def is_docx(data: bytes) -> bool:
+    """Return True if ``data`` is a Word (OOXML) document rather than a PDF."""
+    if not data.startswith(b"PK\x03\x04"):
+        return False
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return "word/document.xml" in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+
+
+def _paragraph_text(paragraph: ElementTree.Element) -> str:
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f"{W_NS}t" and node.text:
+            parts.append(node.text)
+        elif node.tag == f"{W_NS}tab":
+            parts.append("\t")
+        elif node.tag in (f"{W_NS}br", f"{W_NS}cr"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def _table_lines(table: ElementTree.Element) -> List[str]:
+    lines = []
+    for row in table.iter(f"{W_NS}tr"):
+        cells = [
+            " ".join(filter(None, (_paragraph_text(paragraph) for paragraph in cell.iter(f"{W_NS}p"))))
+            for cell in row.iter(f"{W_NS}tc")
+        ]
+        if any(cells):
+            lines.append(" | ".join(cells))
+    return lines
+
+
+def read_docx_paragraphs(docx_data: bytes) -> List[str]:
+    """Read the body of a DOCX as text blocks in document order; table rows become "a | b | c" lines."""
+    with zipfile.ZipFile(io.BytesIO(docx_data)) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    body = root.find(f"{W_NS}body")
+    blocks = []
+    for element in body if body is not None else []:
+        if element.tag == f"{W_NS}p":
+            text = _paragraph_text(element)
+            if text:
+                blocks.append(text)
+        elif element.tag == f"{W_NS}tbl":
+            blocks.extend(_table_lines(element))
+    return blocks
+
+
+def split_text_pages(blocks: List[str], page_chars: int = DocxConstants.PAGE_CHARS) -> List[dict]:
+    """Group text blocks into text-only pseudo-pages of about ``page_chars`` characters."""
+    pages, current, size = [], [], 0
+    for block in blocks:
+        if current and size + len(block) > page_chars:
+            pages.append({"text": "\n".join(current) + "\n", "image": None})
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 1
+    if current:
+        pages.append({"text": "\n".join(current) + "\n", "image": None})
+    return pages
+
+
+class DocxConverter:
+    """Convert DOCX to PDF with headless LibreOffice, reusing a small pool of user profiles.
+
+    Every conversion starts a fresh ``soffice`` process, so each one still pays
+    LibreOffice's process start-up; what the pool saves is building a user
+    profile, which only the first conversion per slot does. Slots let
+    conversions run in parallel, and converted PDFs are cached by the DOCX
+    content hash. ``benchmarks.run`` reports the cold- and warm-profile cost.
+    Where LibreOffice is not installed, docx2pdf (Microsoft Word) is used
+    instead; that only works on Windows and macOS.
+    """
+
+    def __init__(self, workers: int = DocxConstants.LIBREOFFICE_WORKERS, binary: Optional[str] = None,
+                 profile_dir: str = DocxConstants.LIBREOFFICE_PROFILE_DIR):
+        self.binary = binary or shutil.which("soffice") or shutil.which("libreoffice")
+        self.temp_manager = TempFolderManager()
+        self.cache = ResultCache(
+            cache_dir=DocxConstants.CONVERSION_CACHE_DIR,
+            max_entries=8,
+            max_disk_bytes=DocxConstants.CONVERSION_MAX_BYTES,
+        )
+        self._slots = queue.Queue()
+        for index in range(workers):
+            self._slots.put(os.path.abspath(os.path.join(profile_dir, f"slot-{index}")))
+
+    def convert(self, docx_data: bytes) -> bytes:
+        """Return the PDF rendering of ``docx_data``, blocking until a slot is free."""
+        cache_key = hash_bytes(docx_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self.temp_manager.temp_folder() as temp_folder:
+            docx_path = self.temp_manager.workspace.save_file(temp_folder, "input.docx", docx_data)
+            pdf_path = os.path.join(temp_folder, "input.pdf")
+            if self.binary:
+                self._convert_with_libreoffice(docx_path, temp_folder)
+            elif sys.platform in ("win32", "darwin"):
+                logger.info("LibreOffice not found; converting with docx2pdf.")
+                from docx2pdf import convert
+                convert(docx_path, pdf_path)
+            else:
+                raise ValueError(
+                    "This Word document has no usable text and must be rendered to PDF, but LibreOffice "
+                    "is not installed. Install LibreOffice (e.g. the libreoffice-writer package)."
+                )
+            with open(pdf_path, "rb") as file:
+                pdf_data = file.read()
+
+        self.cache.set(cache_key, pdf_data)
+        return pdf_data
+
+    def _convert_with_libreoffice(self, docx_path: str, output_dir: str):
+        profile_dir = self._slots.get()
+        try:
+            logger.info(f"Converting Word document to PDF with LibreOffice ({os.path.basename(profile_dir)}).")
+            started = time.perf_counter()
+            subprocess.run(
+                [
+                    self.binary, "--headless", "--norestore", "--nolockcheck",
+                    f"-env:UserInstallation=file://{profile_dir}",
+                    "--convert-to", "pdf", "--outdir", output_dir, docx_path,
+                ],
+                check=True,
+                capture_output=True,
+                timeout=DocxConstants.CONVERSION_TIMEOUT,
+            )
+            logger.info(f"LibreOffice conversion took {time.perf_counter() - started:.2f} s.")
+        finally:
+            self._slots.put(profile_dir)
@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from uuid import uuid4
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+EXTRACT_JOB = "extract"
+COMPARE_JOB = "compare"
+FINISHED_STATUSES = {"succeeded", "failed"}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobStore:
+    """SQLite-backed persistence for job state, so queued work survives restarts."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    filename TEXT,
+                    payload BLOB,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def insert(self, job_id: str, kind: str, payload: bytes, filename: Optional[str]):
+        """Persist a new queued job together with its input payload."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO jobs (id, kind, status, filename, payload, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, filename, payload, now, now),
+            )
+
+    def update(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        """Record a status change; finished jobs drop their payload to save space."""
+        drop_payload = status in FINISHED_STATUSES
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?"
+                + (", payload = NULL" if drop_payload else "")
+                + " WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return the job's state (without its payload), or None if unknown."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, kind, status, filename, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def payload(self, job_id: str) -> tuple:
+        """Return ``(kind, filename, payload)`` for a job that still has to run."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT kind, filename, payload FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row["kind"], row["filename"], row["payload"]
+
+    def purge(self, older_than: float) -> int:
+        """Delete finished jobs last updated before ``older_than`` (a UNIX time); return how many."""
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (older_than,)
+            )
+        return cursor.rowcount
+
+    def unfinished(self) -> list:
+        """Return the ids of queued or interrupted jobs, oldest first."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class JobQueue:
+    """In-process async job queue running extraction/comparison jobs on a worker pool.
+
+    Submissions beyond ``max_queue_size`` waiting jobs are rejected with
+    QueueFullError. Job state is persisted to SQLite and unfinished jobs are
+    re-queued on start. Store calls run in a thread, since payloads can be
+    tens of megabytes, and finished jobs are deleted ``retention_seconds``
+    after they finish.
+    """
+
+    def __init__(self, processor, db_path: str, workers: int, max_queue_size: int,
+                 retention_seconds: float, purge_interval: float):
+        self.processor = processor
+        self.store = JobStore(db_path)
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.retention_seconds = retention_seconds
+        self.purge_interval = purge_interval
+        self._queue = None
+        self._tasks = []
+        self._events = {}
+        # Submissions still writing their payload, counted against the queue size.
+        self._submitting = 0
+
+    async def start(self):
+        """Re-queue unfinished jobs and start the workers and the retention purge."""
+        self._queue = asyncio.Queue()
+        recovered = await asyncio.to_thread(self.store.unfinished)
+        for job_id in recovered:
+            await asyncio.to_thread(self.store.update, job_id, "queued")
+            self._events[job_id] = asyncio.Event()
+            self._queue.put_nowait(job_id)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} unfinished job(s) from the job store.")
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._purge_finished()))
+
+    async def stop(self):
+        """Cancel the workers; running jobs are re-queued on the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.store.close)
+
+    async def submit(self, kind: str, payload: bytes, filename: Optional[str] = None) -> str:
+        """Queue a job and return its id, or raise QueueFullError under backpressure."""
+        if self._queue.qsize() + self._submitting >= self.max_queue_size:
+            raise QueueFullError(f"Job queue is full ({self.max_queue_size} jobs waiting).")
+        job_id = str(uuid4())
+        self._submitting += 1
+        try:
+            await asyncio.to_thread(self.store.insert, job_id, kind, payload, filename)
+        finally:
+            self._submitting -= 1
+        self._events[job_id] = asyncio.Event()
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Return the current state of a job."""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Long-poll: wait up to ``timeout`` seconds for the job to finish, then return its state."""
+        job = await self.get(job_id)
+        event = self._events.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES or event is None or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await self.get(job_id)
+
+    def stats(self) -> dict:
+        """Return queue depth and worker count."""
+        return {"queued": self._queue.qsize() if self._queue else 0, "workers": self.workers}
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _purge_finished(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.store.purge, time.time() - self.retention_seconds)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not purge finished jobs: {e}")
+            else:
+                if purged:
+                    logger.info(f"Purged {purged} finished job(s) older than {self.retention_seconds:.0f} s.")
+            await asyncio.sleep(self.purge_interval)
+
+    async def _run(self, job_id: str):
+        await asyncio.to_thread(self.store.update, job_id, "running")
+        kind, filename, payload = await asyncio.to_thread(self.store.payload, job_id)
+        try:
+            if kind == EXTRACT_JOB:
+                result = await self.processor.extract_text_and_images(pdf_data=payload)
+            elif kind == COMPARE_JOB:
+                documents = json.loads(payload)
+                result = await self.processor.compare_documents(documents["doc1"], documents["doc2"])
+            else:
+                raise ValueError(f"Unknown job kind: {kind}")
+            await asyncio.to_thread(self.store.update, job_id, "succeeded", result=result)
+        except asyncio.CancelledError:
+            # Leave the job as running so it is recovered on the next start.
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await asyncio.to_thread(self.store.update, job_id, "failed", error=str(e))
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from pydantic import BaseModel
+from typing import AsyncIterator, Awaitable, Callable, Coroutine, List, NamedTuple, Optional
+from services.openai_transport import (
+    CompletionStream, parse_completion, post_chat_completion, response_format_param, server_sent_events,
+)
+from services.page_renderer import estimate_image_tokens as estimate_page_image_tokens
+from services.payload import ImageURL, PayloadTooLargeError, RequestBody
+from utils.constants import LLMClientConstants, PageRenderConstants, PayloadConstants
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket holding up to ``capacity`` units, refilled continuously per second."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        """Wait until ``amount`` units are available and take them."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.refill_per_second)
+                self._updated_at = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.refill_per_second)
+
+
+class RateLimiter:
+    """Client-side limiter for both requests per minute and tokens per minute.
+
+    Must only be used from one event loop (``LLMClient`` runs all requests on its own loop).
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int):
+        """Wait for one request slot and ``tokens`` tokens of budget."""
+        await self._requests.acquire(1)
+        await self._tokens.acquire(tokens)
+
+
+def _message_parts(message: dict) -> List[dict]:
+    content = message.get("content")
+    return content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+
+
+def estimate_image_tokens(messages: List[dict]) -> int:
+    """Estimate the vision tokens of the image parts in chat messages."""
+    tokens = 0
+    for message in messages:
+        for part in _message_parts(message):
+            if part.get("type") != "image_url":
+                continue
+            url, detail = part["image_url"]["url"], part["image_url"].get("detail", "auto")
+            if isinstance(url, ImageURL) and url.width and url.height:
+                tokens += estimate_page_image_tokens(url.width, url.height, detail)
+            else:
+                # Size unknown: assume a typical portrait page (four tiles) for high detail.
+                tokens += PageRenderConstants.IMAGE_BASE_TOKENS
+                if detail != "low":
+                    tokens += PageRenderConstants.IMAGE_TILE_TOKENS * 4
+    return tokens
+
+
+def estimate_request_tokens(messages: List[dict], max_tokens: int) -> int:
+    """Roughly estimate the tokens a chat request will consume, for rate limiting."""
+    text_chars = sum(
+        len(part.get("text", "")) for message in messages for part in _message_parts(message)
+    )
+    return max_tokens + text_chars // 4 + estimate_image_tokens(messages)
+
+
+class StreamChunk(NamedTuple):
+    """A piece of streamed output text, or (last) the final parsed completion."""
+    delta: str = ""
+    completion: Optional[object] = None
+
+
+class LLMClient:
+    """Long-lived OpenAI client with connection pooling, rate limiting and retries.
+
+    All requests run on one event loop in a background thread, which owns the
+    single ``AsyncOpenAI`` client, its HTTP connection pool and the rate
+    limiter. Callers on any loop (e.g. a Streamlit ``asyncio.run`` per click,
+    or API worker threads) therefore share connections and one process-wide
+    request/token budget. Chat completions are
+    posted on the same pool with the JSON body streamed in chunks (see
+    ``RequestBody``), so a request with many page images is never held as one
+    serialized string; bodies over ``max_request_bytes`` are refused.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None,
+                 timeout: float = LLMClientConstants.REQUEST_TIMEOUT,
+                 max_retries: int = LLMClientConstants.MAX_RETRIES,
+                 backoff_base: float = LLMClientConstants.BACKOFF_BASE,
+                 backoff_max: float = LLMClientConstants.BACKOFF_MAX,
+                 requests_per_minute: int = LLMClientConstants.REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = LLMClientConstants.TOKENS_PER_MINUTE,
+                 max_request_bytes: int = PayloadConstants.MAX_REQUEST_BYTES):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_request_bytes = max_request_bytes
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self._client = None
+        self._http_client = None
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Return the pooled client; only use it on the client's own loop (see ``call``)."""
+        if self._client is None:
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLMClientConstants.MAX_CONNECTIONS,
+                    max_keepalive_connections=LLMClientConstants.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=LLMClientConstants.KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=LLMClientConstants.CONNECT_TIMEOUT),
+            )
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=self._http_client,
+                timeout=self.timeout,
+                max_retries=0,  # retries are handled here, with rate limiting
+            )
+        return self._client
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """Return the connection pool behind ``client``."""
+        self.client  # creates the pool on first use
+        return self._http_client
+
+    async def call(self, function: Callable[[AsyncOpenAI], Awaitable]):
+        """Run an SDK call, e.g. ``lambda client: client.batches.retrieve(batch_id)``, on the client's loop."""
+        async def run():
+            return await function(self.client)
+
+        return await self._run(run())
+
+    async def parse(self, messages: List[dict], response_format: type[BaseModel], **params):
+        """Run a structured-output chat completion with rate limiting and retries."""
+        return await self._run(self._parse(messages, response_format, **params))
+
+    async def stream_parse(self, messages: List[dict], response_format: type[BaseModel], **params) -> AsyncIterator[StreamChunk]:
+        """Stream a structured-output chat completion.
+
+        Yields the output text as it arrives, then one chunk carrying the final
+        completion, parsed and validated against ``response_format``. Failures
+        before the first token are retried like ``parse``; once output has been
+        yielded, an error is raised to the caller instead.
+        """
+        caller = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def post(item: tuple):
+            try:
+                caller.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # the caller's loop has already closed
+
+        async def pump():
+            try:
+                async for chunk in self._stream_parse(messages, response_format, **params):
+                    post((chunk, None))
+            except Exception as e:
+                post((None, e))
+            else:
+                post((None, None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._background_loop())
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            future.cancel()
+
+    def request_bytes(self, messages: List[dict], response_format: type[BaseModel], stream: bool = False, **params) -> int:
+        """Return the exact size of the body ``parse`` (or, with ``stream``, ``stream_parse``) sends."""
+        return self._request_body(messages, response_format, self._body_params(params, stream)).size
+
+    async def aclose(self):
+        """Close the connection pool and stop the background loop."""
+        await asyncio.to_thread(self.close)
+
+    def close(self):
+        """Close the connection pool and stop the background loop; pending requests are cancelled."""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+            client, self._client, self._http_client = self._client, None, None
+        if loop is None:
+            return
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=LLMClientConstants.CONNECT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"Could not close the OpenAI connection pool cleanly: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        # The limiter's asyncio primitives belong to the stopped loop.
+        self.limiter = RateLimiter(self.limiter.requests_per_minute, self.limiter.tokens_per_minute)
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+
+                def run():
+                    loop.run_forever()
+                    loop.close()
+
+                threading.Thread(target=run, name="llm-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _run(self, coroutine: Coroutine):
+        """Run ``coroutine`` on the client's loop; cancelling the caller cancels it there too."""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, self._background_loop()))
+
+    async def _parse(self, messages: List[dict], response_format: type[BaseModel], **params):
+        body = self._request_body(messages, response_format, self._body_params(params, stream=False))
+        estimated_tokens = estimate_request_tokens(messages, params.get("max_tokens", 0))
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated_tokens)
+            try:
+                response = await post_chat_completion(self.client, self.http_client, body)
+                try:
+                    data = await response.aread()
+                finally:
+                    await response.aclose()
+                return parse_completion(data, response_format)
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                logger.warning(f"OpenAI request failed ({e.__class__.__name__}), retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+
+    async def _stream_parse(self, messages: List[dict], response_format: type[BaseModel], **params) -> AsyncIterator[StreamChunk]:
+        body = self._request_body(messages, response_format, self._body_params(params, stream=True))
+        estimated_tokens = estimate_request_tokens(messages, params.get("max_tokens", 0))
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimated_tokens)
+            started_output = False
+            try:
+                stream = CompletionStream(response_format)
+                response = await post_chat_completion(self.client, self.http_client, body)
+                try:
+                    async for payload in server_sent_events(response):
+                        for delta in stream.feed(payload):
+                            started_output = True
+                            yield StreamChunk(delta=delta)
+                finally:
+                    await response.aclose()
+                yield StreamChunk(completion=stream.final())
+                return
+            except Exception as e:
+                if started_output or attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                logger.warning(f"OpenAI stream failed ({e.__class__.__name__}), retrying in {delay:.2f}s.")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _body_params(params: dict, stream: bool) -> dict:
+        return {**params, "stream": True, "stream_options": {"include_usage": True}} if stream else params
+
+    def _request_body(self, messages: List[dict], response_format: type[BaseModel], params: dict) -> RequestBody:
+        body = RequestBody({
+            "messages": messages,
+            "response_format": response_format_param(response_format),
+            **params,
+        })
+        if body.size > self.max_request_bytes:
+            raise PayloadTooLargeError(f"Request body is {body.size} bytes; the limit is {self.max_request_bytes} bytes.")
+        return body
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APIConnectionError, APITimeoutError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After when present."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(error, APIStatusError):
+            headers = error.response.headers
+            try:
+                if "retry-after-ms" in headers:
+                    delay = max(delay, float(headers["retry-after-ms"]) / 1000)
+                elif "retry-after" in headers:
+                    delay = max(delay, float(headers["retry-after"]))
+            except ValueError:
+                pass
+        return min(delay, self.backoff_max)
@@ -0,0 +1,125 @@
+"""Chat completion transport with streamed request bodies.
+
+The OpenAI SDK only sends JSON bodies it serializes itself, which would hold a
+request with many page images as one string. Chat completions are therefore
+posted here on the SDK client's own connection pool with a chunked
+``RequestBody``, and the responses are handed back to the SDK's
+structured-output parsing. This module is the only place that depends on SDK
+internals (``openai.lib._parsing`` and ``openai.lib.streaming.chat``); it is
+written against openai 1.58.1, pinned in requirements.txt, and must be
+re-checked whenever the SDK is upgraded.
+"""
+import json
+from typing import AsyncIterator, List
+
+import httpx
+from openai import (
+    NOT_GIVEN, AsyncOpenAI, APIConnectionError, APIError, APIStatusError, APITimeoutError, AuthenticationError,
+    BadRequestError, ConflictError, InternalServerError, NotFoundError, PermissionDeniedError, RateLimitError,
+    UnprocessableEntityError,
+)
+from openai.lib._parsing._completions import parse_chat_completion, type_to_response_format_param
+from openai.lib.streaming.chat import ChatCompletionStreamState
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from pydantic import BaseModel
+
+from services.payload import RequestBody
+
+# The SDK's own status code to exception mapping, so callers can catch the documented subclasses.
+STATUS_ERRORS = {
+    400: BadRequestError,
+    401: AuthenticationError,
+    403: PermissionDeniedError,
+    404: NotFoundError,
+    409: ConflictError,
+    422: UnprocessableEntityError,
+    429: RateLimitError,
+}
+
+
+def response_format_param(response_format: type[BaseModel]) -> dict:
+    """Return the strict ``json_schema`` response format the SDK would send for ``response_format``."""
+    return type_to_response_format_param(response_format)
+
+
+async def post_chat_completion(client: AsyncOpenAI, http_client: httpx.AsyncClient, body: RequestBody) -> httpx.Response:
+    """POST a chat completion body in chunks and return the (unread) response.
+
+    Transport failures and error statuses raise the same exception types as
+    SDK calls (e.g. ``RateLimitError`` for 429), so callers handle them alike.
+    """
+    headers = {name: value for name, value in client.default_headers.items() if isinstance(value, str)}
+    headers.update(client.auth_headers)
+    headers["Content-Length"] = str(body.size)
+    # ``aiter`` makes a fresh iterator, so every attempt sends the body from the start.
+    request = http_client.build_request(
+        "POST", f"{str(client.base_url).rstrip('/')}/chat/completions", headers=headers, content=body.aiter(),
+    )
+    try:
+        response = await http_client.send(request, stream=True)
+    except httpx.TimeoutException as e:
+        raise APITimeoutError(request=request) from e
+    except httpx.TransportError as e:
+        raise APIConnectionError(message=str(e) or "Connection error.", request=request) from e
+    if response.status_code >= 400:
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+        try:
+            error_body = response.json()
+        except ValueError:
+            error_body = response.text
+        raise status_error(response, error_body)
+    return response
+
+
+def status_error(response: httpx.Response, body) -> APIStatusError:
+    """Return the SDK exception for an error response, as the SDK client itself would raise it."""
+    error = body.get("error") if isinstance(body, dict) else None
+    message = error.get("message") if isinstance(error, dict) else body
+    # Like the SDK, the exception's body is the "error" object when there is one.
+    body = error if isinstance(error, dict) else body
+    if response.status_code >= 500:
+        error_class = InternalServerError
+    else:
+        error_class = STATUS_ERRORS.get(response.status_code, APIStatusError)
+    return error_class(f"Error code: {response.status_code} - {message}", response=response, body=body)
+
+
+def parse_completion(data: bytes, response_format: type[BaseModel]):
+    """Parse a chat completion response body into the SDK's ``ParsedChatCompletion``."""
+    return parse_chat_completion(
+        response_format=response_format,
+        input_tools=NOT_GIVEN,
+        chat_completion=ChatCompletion.model_validate_json(data),
+    )
+
+
+class CompletionStream:
+    """Accumulate streamed chat completion chunks into the SDK's final ``ParsedChatCompletion``."""
+
+    def __init__(self, response_format: type[BaseModel]):
+        self._state = ChatCompletionStreamState(input_tools=NOT_GIVEN, response_format=response_format)
+
+    def feed(self, payload: dict) -> List[str]:
+        """Add one chunk and return the output text it carries."""
+        events = self._state.handle_chunk(ChatCompletionChunk.model_validate(payload))
+        return [event.delta for event in events if event.type == "content.delta" and event.delta]
+
+    def final(self):
+        return self._state.get_final_completion()
+
+
+async def server_sent_events(response: httpx.Response) -> AsyncIterator[dict]:
+    """Yield the JSON payloads of a chat completion event stream."""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return
+        payload = json.loads(data)
+        if payload.get("error"):
+            raise APIError(payload["error"].get("message", "Stream error."), response.request, body=payload["error"])
+        yield payload
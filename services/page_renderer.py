@@ -0,0 +1,187 @@
+import asyncio
+import io
+import logging
+import math
+import multiprocessing
+import os
+import string
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+from PIL import Image, ImageOps
+from typing import List, Optional
+from utils.constants import PageRenderConstants
+
+logger = logging.getLogger(__name__)
+
+_READABLE_CHARS = set(string.ascii_letters + string.digits + string.punctuation + string.whitespace + "₹€£")
+
+
+def estimate_image_tokens(width: int, height: int, detail: str) -> int:
+    """Estimate the vision token cost of one image using OpenAI's tiling rules."""
+    if detail == "low":
+        return PageRenderConstants.IMAGE_BASE_TOKENS
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return PageRenderConstants.IMAGE_BASE_TOKENS + PageRenderConstants.IMAGE_TILE_TOKENS * tiles
+
+
+def estimate_document_tokens(images: List[dict]) -> int:
+    """Estimate the total vision token cost of a document's page images."""
+    return sum(estimate_image_tokens(image["width"], image["height"], image["detail"]) for image in images)
+
+
+class PagePolicy:
+    """Decide, per page, whether and how a PDF page is rasterized for the model.
+
+    Pages with a usable text layer skip the image (or drop to low detail);
+    scanned pages are rendered at a tuned DPI, optionally in grayscale, with
+    blank margins cropped and JPEG compression applied.
+    """
+
+    def __init__(self, min_text_chars: int = PageRenderConstants.MIN_TEXT_CHARS,
+                 min_text_quality: float = PageRenderConstants.MIN_TEXT_QUALITY,
+                 text_page_image: str = PageRenderConstants.TEXT_PAGE_IMAGE,
+                 dpi: int = PageRenderConstants.DPI,
+                 jpeg_quality: int = PageRenderConstants.JPEG_QUALITY,
+                 grayscale: bool = PageRenderConstants.GRAYSCALE,
+                 crop_margins: bool = PageRenderConstants.CROP_MARGINS):
+        if text_page_image not in ("skip", "low"):
+            raise ValueError("text_page_image must be 'skip' or 'low'.")
+        self.min_text_chars = min_text_chars
+        self.min_text_quality = min_text_quality
+        self.text_page_image = text_page_image
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.grayscale = grayscale
+        self.crop_margins = crop_margins
+
+    def fingerprint(self) -> dict:
+        """Return the settings that affect what is sent to the model."""
+        return dict(vars(self))
+
+    def has_text_layer(self, text: str) -> bool:
+        """Return True if the page text is long and clean enough to stand in for the image."""
+        stripped = text.strip()
+        if len(stripped) < self.min_text_chars:
+            return False
+        readable = sum(1 for char in stripped if char in _READABLE_CHARS or char.isalpha())
+        return readable / len(stripped) >= self.min_text_quality
+
+    def render_page(self, page: fitz.Page) -> dict:
+        """Return the page text and, if the policy requires one, an encoded image."""
+        text = page.get_text()
+        if not self.has_text_layer(text):
+            image = self._render_image(page, "high")
+        elif self.text_page_image == "low":
+            image = self._render_image(page, "low")
+        else:
+            image = None
+        return {"text": text, "image": image}
+
+    def _render_image(self, page: fitz.Page, detail: str) -> dict:
+        """Rasterize a page into a compressed JPEG image part."""
+        colorspace = fitz.csGRAY if self.grayscale else fitz.csRGB
+        pixmap = page.get_pixmap(dpi=self.dpi, colorspace=colorspace, alpha=False)
+        mode = "L" if self.grayscale else "RGB"
+        image = Image.frombytes(mode, (pixmap.width, pixmap.height), pixmap.samples)
+
+        if self.crop_margins:
+            image = self._crop_blank_margins(image)
+
+        max_side = PageRenderConstants.LOW_DETAIL_SIDE if detail == "low" else PageRenderConstants.MAX_IMAGE_SIDE
+        image.thumbnail((max_side, max_side))
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.jpeg_quality, optimize=True)
+        return {
+            "data": buffer.getvalue(),
+            "mime": "image/jpeg",
+            "detail": detail,
+            "width": image.width,
+            "height": image.height,
+        }
+
+    @staticmethod
+    def _crop_blank_margins(image: Image.Image) -> Image.Image:
+        """Crop near-white borders, keeping a small padding around the content."""
+        grayscale = image if image.mode == "L" else image.convert("L")
+        threshold = PageRenderConstants.CROP_THRESHOLD
+        mask = ImageOps.invert(grayscale).point(lambda value: 255 if value > threshold else 0)
+        bbox = mask.getbbox()
+        if not bbox:
+            return image
+        padding = PageRenderConstants.CROP_PADDING
+        left, top, right, bottom = bbox
+        return image.crop((
+            max(0, left - padding),
+            max(0, top - padding),
+            min(image.width, right + padding),
+            min(image.height, bottom + padding),
+        ))
+
+
+def downscale_image(image: dict, max_side: int = PageRenderConstants.LOW_DETAIL_SIDE,
+                    jpeg_quality: int = PageRenderConstants.JPEG_QUALITY) -> dict:
+    """Re-encode a rendered page image at most ``max_side`` pixels on its longest side, at low detail."""
+    with Image.open(io.BytesIO(image["data"])) as source:
+        source.thumbnail((max_side, max_side))
+        buffer = io.BytesIO()
+        source.save(buffer, format="JPEG", quality=jpeg_quality, optimize=True)
+        return {**image, "data": buffer.getvalue(), "detail": "low", "width": source.width, "height": source.height}
+
+
+def render_page_range(pdf_data: bytes, start: int, stop: int, policy: PagePolicy) -> List[dict]:
+    """Open the document independently and render pages ``start`` to ``stop - 1``.
+
+    Runs inside pool workers, so it must stay a picklable module-level function.
+    """
+    with fitz.open(stream=pdf_data, filetype="pdf") as document:
+        return [policy.render_page(document.load_page(page_num)) for page_num in range(start, stop)]
+
+
+class PageRenderPool:
+    """Render PDF pages off the event loop, splitting large documents across processes."""
+
+    def __init__(self, max_workers: Optional[int] = None,
+                 min_pages_for_pool: int = PageRenderConstants.MIN_PAGES_FOR_POOL):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_pages_for_pool = min_pages_for_pool
+        self._executor = None
+
+    async def render(self, pdf_data: bytes, policy: PagePolicy) -> List[dict]:
+        """Render every page of ``pdf_data`` and return the results in page order."""
+        with fitz.open(stream=pdf_data, filetype="pdf") as document:
+            page_count = len(document)
+
+        loop = asyncio.get_running_loop()
+        if page_count < self.min_pages_for_pool or self.max_workers == 1:
+            # Small documents are not worth the pickling cost; a thread keeps the loop free.
+            return await loop.run_in_executor(None, render_page_range, pdf_data, 0, page_count, policy)
+
+        executor = self._get_executor()
+        chunk_size = math.ceil(page_count / self.max_workers)
+        futures = [
+            loop.run_in_executor(executor, render_page_range, pdf_data, start, min(start + chunk_size, page_count), policy)
+            for start in range(0, page_count, chunk_size)
+        ]
+        logger.info(f"Rendering {page_count} pages in {len(futures)} worker process(es).")
+        chunks = await asyncio.gather(*futures)
+        return [page for chunk in chunks for page in chunk]
+
+    def shutdown(self):
+        """Stop the worker processes, if any were started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers avoid forking a multi-threaded server process.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
@@ -0,0 +1,139 @@
+import base64
+import json
+import logging
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional
+from uuid import uuid4
+
+from services.page_renderer import downscale_image
+from utils.constants import PayloadConstants
+
+logger = logging.getLogger(__name__)
+
+
+class PayloadTooLargeError(ValueError):
+    """Raised when a request cannot be made to fit the per-request byte budget."""
+
+
+class ImageURL:
+    """A page image's data URL, kept as the raw image bytes.
+
+    The base64 text is produced slice by slice while a request body is
+    written, so no full-size encoded copy of the image is ever held; a retried
+    request simply writes it again from the same buffer. The pixel size, when
+    known, lets the image's token cost be estimated from the messages.
+    """
+
+    __slots__ = ("data", "mime", "width", "height", "prefix")
+
+    def __init__(self, data: bytes, mime: str, width: Optional[int] = None, height: Optional[int] = None):
+        self.data = data
+        self.mime = mime
+        self.width = width
+        self.height = height
+        self.prefix = f"data:{mime};base64,".encode("ascii")
+
+    def __len__(self) -> int:
+        return len(self.prefix) + 4 * -(-len(self.data) // 3)
+
+    def __str__(self) -> str:
+        return (self.prefix + base64.b64encode(self.data)).decode("ascii")
+
+    def chunks(self, chunk_bytes: int = PayloadConstants.STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        yield self.prefix
+        # Slices on a multiple of 3 bytes encode to base64 without padding, so they concatenate cleanly.
+        step = max(3, chunk_bytes // 4 * 3)
+        view = memoryview(self.data)
+        for start in range(0, len(view), step):
+            yield base64.b64encode(view[start:start + step])
+
+
+class RequestBody:
+    """A JSON request body written in chunks, with image data URLs streamed from their buffers.
+
+    Everything except the images is serialized once into small byte pieces;
+    ``size`` is exact, so the body can be sent with a Content-Length and
+    checked against a byte budget before anything is sent. ``aiter`` returns a
+    fresh iterator on every call, so the same body can be sent again on retry.
+    """
+
+    def __init__(self, body: dict, chunk_bytes: int = PayloadConstants.STREAM_CHUNK_BYTES):
+        self.chunk_bytes = chunk_bytes
+        placeholder = f"image-{uuid4().hex}"
+        images = []
+
+        def default(value):
+            if isinstance(value, ImageURL):
+                images.append(value)
+                return placeholder
+            raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+        skeleton = json.dumps(body, default=default, separators=(",", ":"), ensure_ascii=False)
+        self._texts = [piece.encode("utf-8") for piece in skeleton.split(placeholder)]
+        self._images = images
+        self.size = sum(len(text) for text in self._texts) + sum(len(image) for image in images)
+
+    def chunks(self) -> Iterator[bytes]:
+        for index, text in enumerate(self._texts):
+            for start in range(0, len(text), self.chunk_bytes):
+                yield text[start:start + self.chunk_bytes]
+            if index < len(self._images):
+                yield from self._images[index].chunks(self.chunk_bytes)
+
+    async def aiter(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks():
+            yield chunk
+
+    def write_to(self, file) -> int:
+        """Write the body to a binary file and return the number of bytes written."""
+        for chunk in self.chunks():
+            file.write(chunk)
+        return self.size
+
+
+def image_url_bytes(image: dict) -> int:
+    return len(ImageURL(image["data"], image["mime"]))
+
+
+class FittedImages(NamedTuple):
+    images: List[dict]
+    dropped: int
+    downscaled: int
+
+
+def fit_images(images: List[dict], other_bytes: int, max_bytes: int = PayloadConstants.MAX_REQUEST_BYTES) -> FittedImages:
+    """Drop or downscale page images so a request stays within ``max_bytes``.
+
+    Low-detail images accompany pages that already have a usable text layer,
+    so they are dropped first (last pages first). Then the largest high-detail
+    images are downscaled to low detail. If the request still does not fit it
+    is refused, since leaving out a scanned page would silently lose content.
+    """
+    sizes = [image_url_bytes(image) for image in images]
+    total = other_bytes + sum(sizes)
+    if total <= max_bytes:
+        return FittedImages(images, 0, 0)
+
+    images, dropped, downscaled = list(images), 0, 0
+    for index in reversed(range(len(images))):
+        if total <= max_bytes:
+            break
+        if images[index]["detail"] == "low":
+            total -= sizes[index]
+            images[index] = None
+            dropped += 1
+    for index in sorted(range(len(images)), key=lambda index: sizes[index], reverse=True):
+        if total <= max_bytes:
+            break
+        if images[index] is None or images[index]["detail"] == "low":
+            continue
+        images[index] = downscale_image(images[index])
+        new_size = image_url_bytes(images[index])
+        total -= sizes[index] - new_size
+        sizes[index] = new_size
+        downscaled += 1
+    if total > max_bytes:
+        raise PayloadTooLargeError(
+            f"Request needs about {total} bytes even with page images downscaled; the limit is {max_bytes} bytes."
+        )
+    logger.warning(f"Request over the {max_bytes} byte budget: dropped {dropped} and downscaled {downscaled} page image(s).")
+    return FittedImages([image for image in images if image is not None], dropped, downscaled)
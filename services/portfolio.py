@@ -0,0 +1,185 @@
+import logging
+import warnings
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.comparison import FIELD_LABELS, parse_amount, parse_duration_months
+from utils.constants import PortfolioConstants
+
+logger = logging.getLogger(__name__)
+
+# Normalized numeric features and the agreement field each one is derived from.
+FEATURE_FIELDS = {
+    "MonthlyRent": "RentalAmount",
+    "SecurityDeposit": "SecurityDeposit",
+    "DepositMonths": "SecurityDeposit",
+    "LeaseMonths": "LeaseDuration",
+    "NoticeDays": "NoticePeriod",
+}
+FEATURES = list(FEATURE_FIELDS)
+# Scale factors that make the median and mean absolute deviations comparable to a standard deviation.
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+def monthly_rent(value) -> Optional[float]:
+    """Parse a rent string into a monthly amount; rent without a stated period is taken as monthly."""
+    parsed = parse_amount(value)
+    if parsed is None:
+        return None
+    amount, period = parsed
+    return amount / 12 if period == "year" else amount
+
+
+def notice_days(value) -> Optional[float]:
+    """Parse a notice period into days."""
+    months = parse_duration_months(value)
+    return None if months is None else round(months * 365 / 12)
+
+
+def agreement_features(agreement: dict) -> Dict[str, float]:
+    """Return the normalized numeric features of an extracted agreement, NaN where unparseable."""
+    rent = monthly_rent(agreement.get("RentalAmount"))
+    deposit = parse_amount(agreement.get("SecurityDeposit"))
+    deposit = deposit[0] if deposit else None
+    lease = parse_duration_months(agreement.get("LeaseDuration"))
+    notice = notice_days(agreement.get("NoticePeriod"))
+    features = {
+        "MonthlyRent": rent,
+        "SecurityDeposit": deposit,
+        "DepositMonths": deposit / rent if deposit is not None and rent else None,
+        "LeaseMonths": lease,
+        "NoticeDays": notice,
+    }
+    return {name: np.nan if value is None else float(value) for name, value in features.items()}
+
+
+class PortfolioIndex:
+    """Columnar table of extracted agreements for one-against-many comparison.
+
+    Each agreement is reduced to normalized numeric features (monthly rent,
+    deposit, deposit in months of rent, lease months, notice days). A new
+    agreement is scored against every column at once with robust statistics,
+    so comparing against hundreds of agreements needs no model calls.
+    """
+
+    def __init__(self):
+        self.frame = pd.DataFrame(columns=FEATURES, dtype=float)
+        self.agreements = {}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    @classmethod
+    def from_agreements(cls, agreements: Dict[str, dict]) -> "PortfolioIndex":
+        """Build an index from ``{document_id: extracted agreement}``."""
+        index = cls()
+        index.add_many(agreements.items())
+        return index
+
+    def add(self, document_id: str, agreement: dict):
+        """Add or replace one agreement."""
+        self.add_many([(document_id, agreement)])
+
+    def add_many(self, items: Iterable[Tuple[str, dict]]):
+        """Add or replace several agreements with a single table rebuild."""
+        items = list(items)
+        if not items:
+            return
+        rows = pd.DataFrame(
+            [agreement_features(agreement) for _, agreement in items],
+            index=[document_id for document_id, _ in items],
+            columns=FEATURES,
+            dtype=float,
+        )
+        rows = rows[~rows.index.duplicated(keep="last")]
+        existing = self.frame.drop(index=rows.index, errors="ignore")
+        self.frame = pd.concat([existing, rows]) if len(existing) else rows
+        self.agreements.update(items)
+
+    def remove(self, document_id: str):
+        self.frame = self.frame.drop(index=document_id, errors="ignore")
+        self.agreements.pop(document_id, None)
+
+    def score(self, agreement: dict) -> pd.DataFrame:
+        """Score one agreement against the portfolio, one row per feature.
+
+        Columns: the agreement's value, the portfolio median, the deviation from
+        the median in percent, a robust z-score (median/MAD), the percentile rank,
+        the number of portfolio agreements with a value, and an outlier flag.
+        """
+        values = pd.Series(agreement_features(agreement))[FEATURES].to_numpy()
+        return self._score_matrix(values[np.newaxis, :]).xs(0, level="agreement")
+
+    def score_portfolio(self) -> pd.DataFrame:
+        """Score every agreement in the portfolio against the whole set at once."""
+        scores = self._score_matrix(self.frame.to_numpy())
+        return scores.rename(index=dict(enumerate(self.frame.index)), level="agreement")
+
+    def outliers(self) -> pd.DataFrame:
+        """Return the flagged (agreement, feature) pairs of the whole portfolio, most anomalous first."""
+        scores = self.score_portfolio()
+        flagged = scores[scores["Outlier"]]
+        return flagged.reindex(flagged["RobustZ"].abs().sort_values(ascending=False).index)
+
+    @staticmethod
+    def top_anomalies(scores: pd.DataFrame, k: int = PortfolioConstants.TOP_K) -> pd.DataFrame:
+        """Return the ``k`` flagged features of a ``score`` result with the largest robust z-score."""
+        flagged = scores[scores["Outlier"]]
+        return flagged.reindex(flagged["RobustZ"].abs().sort_values(ascending=False).index).head(k)
+
+    def _score_matrix(self, values: np.ndarray) -> pd.DataFrame:
+        """Score each row of ``values`` (agreements x features) against the portfolio columns."""
+        portfolio = self.frame.to_numpy()
+        counts = (~np.isnan(portfolio)).sum(axis=0)
+        with warnings.catch_warnings(), np.errstate(all="ignore"):
+            # Empty or all-missing columns simply produce NaN statistics.
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(portfolio, axis=0)
+            absolute_deviation = np.abs(portfolio - median)
+            mad = np.nanmedian(absolute_deviation, axis=0) * MAD_SCALE
+            # Fall back to the mean absolute deviation when more than half the values are identical.
+            scale = np.where(mad > 0, mad, np.nanmean(absolute_deviation, axis=0) * MEAN_AD_SCALE)
+
+            deviation = values - median
+            robust_z = np.where(scale > 0, deviation / scale, np.where(deviation == 0, 0.0, np.sign(deviation) * np.inf))
+            robust_z = np.clip(robust_z, -PortfolioConstants.MAX_Z, PortfolioConstants.MAX_Z)
+            deviation_pct = np.where(median != 0, deviation / np.abs(median) * 100, np.nan)
+
+        # Percentile rank with ties counted as half, via binary search in each sorted column.
+        percentile = np.full(values.shape, np.nan)
+        for column in range(len(FEATURES)):
+            ordered = np.sort(portfolio[~np.isnan(portfolio[:, column]), column])
+            if not len(ordered):
+                continue
+            below = np.searchsorted(ordered, values[:, column], side="left")
+            not_above = np.searchsorted(ordered, values[:, column], side="right")
+            percentile[:, column] = (below + not_above) / 2 / len(ordered) * 100
+        percentile[np.isnan(values)] = np.nan
+
+        outlier = (
+            (np.abs(robust_z) >= PortfolioConstants.OUTLIER_Z)
+            & (counts >= PortfolioConstants.MIN_PORTFOLIO_SIZE)
+            & ~np.isnan(values)
+        )
+        rows = len(values)
+        index = pd.MultiIndex.from_product([range(rows), FEATURES], names=["agreement", "feature"])
+        return pd.DataFrame({
+            "Field": np.tile([FIELD_LABELS[FEATURE_FIELDS[name]] for name in FEATURES], rows),
+            "Value": values.ravel(),
+            "Median": np.tile(median, rows),
+            "DeviationPct": deviation_pct.ravel(),
+            "RobustZ": robust_z.ravel(),
+            "Percentile": percentile.ravel(),
+            "PortfolioCount": np.tile(counts, rows),
+            "Outlier": outlier.ravel(),
+        }, index=index)
+
+
+def scores_to_records(scores: pd.DataFrame) -> List[dict]:
+    """Convert a ``score`` result into JSON-safe records (NaN becomes None)."""
+    frame = scores.round({"Value": 2, "Median": 2, "DeviationPct": 1, "RobustZ": 2, "Percentile": 1})
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [{"Feature": feature, **row} for feature, row in frame.to_dict(orient="index").items()]
@@ -0,0 +1,310 @@
+import base64
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from utils.cache import hash_bytes
+from utils.constants import TemplateConstants
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime used by the universal hash family; products stay within 64 bits.
+_PRIME = (1 << 31) - 1
+
+
+def normalize_page_text(text: str) -> str:
+    """Lowercase and collapse whitespace so layout-only differences do not matter."""
+    return re.sub(r"\s+", " ", text or "").strip().lower()
+
+
+def shingles(text: str, size: int = TemplateConstants.SHINGLE_WORDS) -> np.ndarray:
+    """Return the distinct 32-bit hashes of the ``size``-word shingles of ``text``."""
+    words = text.split()
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = (" ".join(words[index:index + size]) for index in range(len(words) - size + 1))
+    return np.unique(np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.int64))
+
+
+def term_pages(terms: List[dict], page_texts: List[str],
+               min_overlap: float = TemplateConstants.MIN_TERM_OVERLAP) -> List[Optional[int]]:
+    """Attribute each critical term to the page whose words best cover its flagged term and details.
+
+    Terms no page covers well enough get None, so they are never reused for
+    another document.
+    """
+    page_words = [set(re.findall(r"\w{3,}", normalize_page_text(text))) for text in page_texts]
+    pages = []
+    for term in terms:
+        words = set(re.findall(r"\w{3,}", normalize_page_text(f"{term.get('FlaggedTerm', '')} {term.get('Details', '')}")))
+        best, best_overlap = None, 0.0
+        for index, available in enumerate(page_words):
+            overlap = len(words & available) / len(words) if words else 0.0
+            if overlap > best_overlap:
+                best, best_overlap = index, overlap
+        pages.append(best if best_overlap >= min_overlap else None)
+    return pages
+
+
+class PageFingerprint(NamedTuple):
+    exact: str
+    signature: np.ndarray
+
+
+class TemplateMatch(NamedTuple):
+    template_id: str
+    extraction: dict
+    identical_pages: List[int]
+    differing_pages: List[int]
+    # The template's critical terms found on pages that are identical in the new document.
+    identical_page_terms: List[dict]
+
+
+class TemplateIndex:
+    """MinHash/LSH index over page text for recognizing documents built from known templates.
+
+    Every indexed page gets a MinHash signature, split into LSH bands whose
+    buckets map to the pages sharing them, so a lookup only compares against
+    a handful of candidates however many pages are indexed. A document
+    matches a template when most of its pages are near-duplicates of that
+    template's pages; pages whose normalized text is identical can then reuse
+    the template's cached extraction.
+
+    With a ``path``, each template is stored as one SQLite row when it is
+    added, so indexing stays cheap however large the index grows. Templates
+    hold tenant and landlord details, so at most ``max_templates`` are kept
+    (oldest evicted first) and none longer than ``ttl_seconds``.
+    """
+
+    def __init__(self, path: Optional[str] = None, num_perm: int = TemplateConstants.NUM_PERM,
+                 bands: int = TemplateConstants.LSH_BANDS, min_text_chars: int = TemplateConstants.MIN_PAGE_CHARS,
+                 max_templates: int = TemplateConstants.MAX_TEMPLATES,
+                 ttl_seconds: Optional[float] = TemplateConstants.TTL_SECONDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_text_chars = min_text_chars
+        self.max_templates = max_templates
+        self.ttl_seconds = ttl_seconds
+        rng = np.random.default_rng(TemplateConstants.SEED)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+        self._lock = threading.Lock()
+        # Oldest first, so eviction pops from the front.
+        self.templates = OrderedDict()
+        self._pages = []
+        self._page_count = 0
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self._connection = None
+        if path:
+            self._open()
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    @property
+    def page_count(self) -> int:
+        return self._page_count
+
+    def fingerprint(self, text: str) -> Optional[PageFingerprint]:
+        """Return a page's exact hash and MinHash signature, or None if it has too little text."""
+        normalized = normalize_page_text(text)
+        if len(normalized) < self.min_text_chars:
+            return None
+        hashes = shingles(normalized) % _PRIME
+        signature = ((np.outer(self._a, hashes) + self._b[:, np.newaxis]) % _PRIME).min(axis=1)
+        return PageFingerprint(hash_bytes(normalized.encode("utf-8")), signature.astype(np.uint32))
+
+    def add(self, template_id: str, page_texts: List[str], extraction: dict):
+        """Index a document's pages as a template with its extraction result and the page of each critical term."""
+        fingerprints = [self.fingerprint(text) for text in page_texts]
+        pages = term_pages(extraction.get("CriticalTerms", []), page_texts)
+        created_at = time.time()
+        with self._lock:
+            if template_id in self.templates:
+                return
+            self._add(template_id, fingerprints, extraction, pages, created_at)
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO templates (id, created_at, extraction, term_pages, pages) VALUES (?, ?, ?, ?, ?)",
+                        (template_id, created_at, json.dumps(extraction, ensure_ascii=False), json.dumps(pages),
+                         json.dumps([
+                             None if fingerprint is None else
+                             [fingerprint.exact, base64.b64encode(fingerprint.signature.tobytes()).decode("ascii")]
+                             for fingerprint in fingerprints
+                         ])),
+                    )
+            self._evict()
+        logger.info(f"Indexed template {template_id[:12]} with {sum(1 for fp in fingerprints if fp)} page(s).")
+
+    def match(self, page_texts: List[str]) -> Optional[TemplateMatch]:
+        """Find the template the document was built from, if any."""
+        fingerprints = [self.fingerprint(text) for text in page_texts]
+        candidates = defaultdict(dict)
+        # For each template, the template page every identical new page is identical to.
+        identical_to = defaultdict(dict)
+        with self._lock:
+            self._evict()
+            for page_index, fingerprint in enumerate(fingerprints):
+                if fingerprint is None:
+                    continue
+                for template_id, template_page, identical in self._similar_pages(fingerprint):
+                    # Keep the best match per new page; an identical page beats a similar one.
+                    if not candidates[template_id].get(page_index, False):
+                        candidates[template_id][page_index] = identical
+                        if identical:
+                            identical_to[template_id][page_index] = template_page
+            if not candidates:
+                return None
+            template_id, matched = max(candidates.items(), key=lambda item: (len(item[1]), sum(item[1].values())))
+            template = self.templates[template_id]
+
+        coverage = len(matched) / max(len(page_texts), template["page_count"])
+        identical_pages = sorted(page for page, identical in matched.items() if identical)
+        if coverage < TemplateConstants.MIN_MATCH_FRACTION or not identical_pages:
+            return None
+        identical = set(identical_pages)
+        differing_pages = [page for page in range(len(page_texts)) if page not in identical]
+        reused_pages = set(identical_to[template_id].values())
+        terms = template["extraction"].get("CriticalTerms", [])
+        if not reused_pages.issuperset(range(template["page_count"])):
+            terms = [term for term, page in zip(terms, template["term_pages"]) if page is not None and page in reused_pages]
+        logger.info(
+            f"Document matches template {template_id[:12]}: {len(identical_pages)} identical page(s), "
+            f"{len(differing_pages)} differing page(s), {len(terms)} reusable critical term(s)."
+        )
+        return TemplateMatch(template_id, template["extraction"], identical_pages, differing_pages, terms)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS templates (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    extraction TEXT NOT NULL,
+                    term_pages TEXT NOT NULL,
+                    pages TEXT NOT NULL
+                )
+                """
+            )
+            settings = dict(self._connection.execute("SELECT key, value FROM settings").fetchall())
+            if settings and settings != {"num_perm": self.num_perm, "seed": TemplateConstants.SEED}:
+                logger.warning(f"Discarding template index {self.path} built with different MinHash parameters.")
+                self._connection.execute("DELETE FROM templates")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                [("num_perm", self.num_perm), ("seed", TemplateConstants.SEED)],
+            )
+        self._load()
+
+    def _load(self):
+        rows = self._connection.execute(
+            "SELECT id, created_at, extraction, term_pages, pages FROM templates ORDER BY created_at"
+        ).fetchall()
+        with self._lock:
+            for template_id, created_at, extraction, term_pages, pages in rows:
+                fingerprints = [
+                    None if page is None else
+                    PageFingerprint(page[0], np.frombuffer(base64.b64decode(page[1]), dtype=np.uint32))
+                    for page in json.loads(pages)
+                ]
+                self._add(template_id, fingerprints, json.loads(extraction), json.loads(term_pages), created_at)
+            self._evict()
+        logger.info(f"Loaded {len(self.templates)} template(s) with {self._page_count} page(s) from {self.path}.")
+
+    def _evict(self):
+        """Drop expired templates, then the oldest ones over ``max_templates``."""
+        evicted = []
+        while self.templates:
+            template_id, template = next(iter(self.templates.items()))
+            expired = self.ttl_seconds is not None and time.time() - template["created_at"] > self.ttl_seconds
+            if not expired and len(self.templates) <= self.max_templates:
+                break
+            self._remove(template_id)
+            evicted.append((template_id,))
+        if evicted and self._connection is not None:
+            with self._connection:
+                self._connection.executemany("DELETE FROM templates WHERE id = ?", evicted)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} template(s) from the template index.")
+
+    def _remove(self, template_id: str):
+        template = self.templates.pop(template_id)
+        for entry in template["entries"]:
+            _, _, fingerprint = self._pages[entry]
+            for band, key in enumerate(self._band_keys(fingerprint.signature)):
+                bucket = self._buckets[band][key]
+                bucket.remove(entry)
+                if not bucket:
+                    del self._buckets[band][key]
+            self._pages[entry] = None
+            self._page_count -= 1
+
+    def _add(self, template_id: str, fingerprints: List[Optional[PageFingerprint]], extraction: dict,
+             term_pages: List[Optional[int]], created_at: float):
+        template = {
+            "extraction": extraction,
+            "page_count": len(fingerprints),
+            "fingerprints": fingerprints,
+            "term_pages": term_pages,
+            "created_at": created_at,
+            "entries": [],
+        }
+        self.templates[template_id] = template
+        for page_index, fingerprint in enumerate(fingerprints):
+            if fingerprint is None:
+                continue
+            entry = len(self._pages)
+            self._pages.append((template_id, page_index, fingerprint))
+            template["entries"].append(entry)
+            self._page_count += 1
+            for band, key in enumerate(self._band_keys(fingerprint.signature)):
+                self._buckets[band][key].append(entry)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _similar_pages(self, fingerprint: PageFingerprint) -> list:
+        """Return ``(template_id, page_index, identical)`` for indexed pages similar to ``fingerprint``."""
+        entries = set()
+        for band, key in enumerate(self._band_keys(fingerprint.signature)):
+            entries.update(self._buckets[band].get(key, ()))
+        similar = []
+        for entry in entries:
+            template_id, page_index, candidate = self._pages[entry]
+            # The fraction of equal MinHash values estimates the Jaccard similarity of the shingle sets.
+            if np.mean(candidate.signature == fingerprint.signature) >= TemplateConstants.MIN_PAGE_SIMILARITY:
+                similar.append((template_id, page_index, candidate.exact == fingerprint.exact))
+        return similar
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Add the root directory (where 'services' is located) to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.stub_server import StubOpenAIServer
+
+
+@pytest.fixture
+def stub():
+    """A fast local OpenAI stub, started for one test."""
+    server = StubOpenAIServer(latency=0.0, jitter=0.0, batch_latency=0.2).start()
+    try:
+        yield server
+    finally:
+        server.stop()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.run import make_processor
+from benchmarks.synthetic import generate_pdf
+from services.batch import BatchRunner, CheckpointMismatchError
+
+
+@pytest.fixture
+def processor(stub, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+    monkeypatch.setenv("OPEN_AI_API_KEY", "stub-key")
+    document_processor = make_processor()
+    try:
+        yield document_processor
+    finally:
+        document_processor.close()
+
+
+@pytest.fixture
+def documents():
+    return {f"doc-{seed}": generate_pdf(2, seed=seed) for seed in range(3)}
+
+
+def submitted_custom_ids(stub) -> list:
+    """Return the custom_id of every request in every batch submitted to the stub."""
+    custom_ids = []
+    for batch in stub.batches.values():
+        _, content = stub.files[batch["input_file_id"]]
+        custom_ids.extend(json.loads(line)["custom_id"] for line in content.decode("utf-8").splitlines() if line.strip())
+    return custom_ids
+
+
+async def interrupt_after_first_submission(runner: BatchRunner, documents: dict):
+    """Start a run and cancel it once one batch is submitted while others are still unsent."""
+    task = asyncio.create_task(runner.run(documents=documents))
+    while not runner.state or not any(batch["status"] == "submitted" for batch in runner.state["batches"]):
+        await asyncio.sleep(0.01)
+    assert any(batch["status"] != "submitted" for batch in runner.state["batches"])
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_interrupted_batch_resumes_each_request_once(stub, processor, documents, tmp_path):
+    checkpoint = str(tmp_path / "batch.json")
+    # One request per batch, so the run is interrupted between batch submissions.
+    runner = BatchRunner(processor, checkpoint, poll_interval=0.05, max_requests_per_batch=1)
+    asyncio.run(interrupt_after_first_submission(runner, documents))
+
+    resumed = BatchRunner(processor, checkpoint, poll_interval=0.05, max_requests_per_batch=1)
+    results = asyncio.run(resumed.run(documents=documents))
+
+    assert sorted(results["extractions"]) == sorted(documents)
+    assert results["errors"] == {}
+    assert sorted(submitted_custom_ids(stub)) == sorted(f"extract:{document_id}" for document_id in documents)
+
+
+def test_resume_with_different_inputs_is_rejected(processor, documents, tmp_path):
+    checkpoint = str(tmp_path / "batch.json")
+    runner = BatchRunner(processor, checkpoint, poll_interval=0.05, max_requests_per_batch=1)
+    asyncio.run(interrupt_after_first_submission(runner, documents))
+
+    other_documents = {**documents, "doc-3": generate_pdf(2, seed=3)}
+    with pytest.raises(CheckpointMismatchError):
+        asyncio.run(BatchRunner(processor, checkpoint, poll_interval=0.05).run(documents=other_documents))
+
+
+def test_completed_checkpoint_is_archived(processor, documents, tmp_path):
+    checkpoint = tmp_path / "batch.json"
+    runner = BatchRunner(processor, str(checkpoint), poll_interval=0.05)
+    asyncio.run(runner.run(documents=documents))
+
+    assert not checkpoint.exists()
+    assert (tmp_path / "batch.completed.json").exists()
+    # The same path now starts a fresh run for new inputs instead of returning stale results.
+    other_documents = {"doc-3": generate_pdf(2, seed=3)}
+    results = asyncio.run(BatchRunner(processor, str(checkpoint), poll_interval=0.05).run(documents=other_documents))
+    assert sorted(results["extractions"]) == ["doc-3"]
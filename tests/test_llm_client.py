@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from openai import BadRequestError, InternalServerError, NotFoundError
+
+from services.llm_client import LLMClient
+from utils.prompts import RentalAgreement
+
+MESSAGES = [{"role": "user", "content": "parse"}]
+
+
+@pytest.fixture
+def client(stub):
+    llm_client = LLMClient("stub-key", base_url=stub.base_url, max_retries=3, backoff_base=0.01, backoff_max=0.05)
+    try:
+        yield llm_client
+    finally:
+        llm_client.close()
+
+
+def statuses(stub) -> list:
+    return [request["status"] for request in stub.requests]
+
+
+def parse(client):
+    return asyncio.run(client.parse(MESSAGES, RentalAgreement))
+
+
+@pytest.mark.parametrize("status", [408, 409, 429, 500, 502, 503, 504])
+def test_retryable_status_is_retried(stub, client, status):
+    stub.fail_next(status, status)
+    response = parse(client)
+    assert response.choices[0].message.parsed.TenantName
+    assert statuses(stub) == [status, status, 200]
+
+
+def test_retries_stop_after_max_retries(stub, client):
+    stub.fail_next(*[503] * 10)
+    with pytest.raises(InternalServerError):
+        parse(client)
+    assert statuses(stub) == [503] * (client.max_retries + 1)
+
+
+@pytest.mark.parametrize("status, error", [(400, BadRequestError), (404, NotFoundError)])
+def test_non_retryable_status_propagates(stub, client, status, error):
+    stub.fail_next(status)
+    with pytest.raises(error):
+        parse(client)
+    assert statuses(stub) == [status]
+
+
+def test_stream_retries_before_first_token(stub, client):
+    stub.fail_next(429, 500)
+
+    async def stream():
+        return [chunk async for chunk in client.stream_parse(MESSAGES, RentalAgreement)]
+
+    chunks = asyncio.run(stream())
+    assert "".join(chunk.delta for chunk in chunks)
+    assert chunks[-1].completion.choices[0].message.parsed.TenantName
+    assert statuses(stub) == [429, 500, 200]
+
+
+def test_client_works_across_event_loops(stub, client):
+    parse(client)
+    stub.fail_next(429)
+    parse(client)
+    parse(client)
+    assert statuses(stub) == [200, 429, 200, 200]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_request_bytes_matches_the_body_sent(stub, client, stream):
+    async def send():
+        if stream:
+            return [chunk async for chunk in client.stream_parse(MESSAGES, RentalAgreement, max_tokens=100)]
+        return await client.parse(MESSAGES, RentalAgreement, max_tokens=100)
+
+    asyncio.run(send())
+    assert stub.requests[-1]["payload_bytes"] == client.request_bytes(MESSAGES, RentalAgreement, stream=stream, max_tokens=100)
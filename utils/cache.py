@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_bytes(data: bytes) -> str:
+    """Return the SHA-256 hex digest of raw bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_json(value: Any) -> str:
+    """Return the SHA-256 hex digest of a value's canonical JSON form."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Two-tier (in-memory LRU + on-disk) cache for JSON-serializable or bytes results.
+
+    The memory tier holds at most ``max_entries`` values. The disk tier, when
+    ``cache_dir`` is given, stores one file per key (JSON, or raw for bytes
+    values) and is bounded by ``max_disk_bytes`` (oldest files evicted first)
+    and ``ttl_seconds``.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_entries: int = 128,
+                 max_disk_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key`` or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                stored_at, value = self._memory[key]
+                if not self._expired(stored_at):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Any):
+        """Store ``value`` under ``key`` in both tiers."""
+        with self._lock:
+            self._remember(key, value)
+        self._write_disk(key, value)
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        for path in self._disk_entries():
+            self._remove(path)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current tier sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": sum(os.path.getsize(path) for path in self._disk_entries()),
+            }
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: Any):
+        self._memory[key] = (time.time(), value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: str, raw: bool = False) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin" if raw else f"{key}.json")
+
+    def _disk_entries(self) -> list:
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith((".json", ".bin"))
+        ]
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        if not self.cache_dir:
+            return None
+        raw = os.path.exists(self._path(key, raw=True))
+        path = self._path(key, raw=raw)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                self._remove(path)
+                return None
+            if raw:
+                with open(path, "rb") as file:
+                    value = file.read()
+            else:
+                with open(path, "r", encoding="utf-8") as file:
+                    value = json.load(file)
+            # Touch the file so disk eviction is least-recently-used.
+            os.utime(path, None)
+            return value
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+    def _write_disk(self, key: str, value: Any):
+        if not self.cache_dir:
+            return
+        raw = isinstance(value, bytes)
+        path = self._path(key, raw=raw)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if raw:
+                with open(tmp_path, "wb") as file:
+                    file.write(value)
+            else:
+                with open(tmp_path, "w", encoding="utf-8") as file:
+                    json.dump(value, file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for path in self._disk_entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if self._expired(stat.st_mtime):
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove cache entry {path}: {e}")
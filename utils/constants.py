@@ -1,5 +1,112 @@
-class FrontendConstants:
-    UPLOAD_DIR = "./uploaded_files"
-
 class DocumentProcessorConstants:
-    PROCESSED_FILES="./processed_files"
\ No newline at end of file
+    PROCESSED_FILES="./processed_files"
+    MAX_CONCURRENT_EXTRACTIONS = 4
+    RENDER_WORKERS = None  # defaults to the CPU count
+    CHUNK_PAGES = 8  # longer documents are extracted in windows of this many pages
+
+class WorkspaceConstants:
+    QUOTA_BYTES = 1024 * 1024 * 1024  # per workspace directory
+    TTL_SECONDS = 6 * 60 * 60  # orphaned folders older than this are reclaimed
+    EVICTION_GRACE_SECONDS = 60  # folders modified more recently are never evicted
+    JANITOR_INTERVAL_SECONDS = 15 * 60
+
+class TemplateConstants:
+    ENABLED = True
+    INDEX_PATH = "./cache/templates.sqlite3"
+    SHINGLE_WORDS = 5
+    NUM_PERM = 128
+    LSH_BANDS = 32  # 4 rows per band: pages above ~0.8 similarity are almost always candidates
+    SEED = 1  # fixes the MinHash permutations so a saved index stays valid
+    MIN_PAGE_CHARS = 200  # pages with less text (e.g. scans) are never fingerprinted
+    MIN_PAGE_SIMILARITY = 0.8  # estimated Jaccard similarity for a page to count as a template page
+    MIN_MATCH_FRACTION = 0.6  # share of pages that must match for a document to match a template
+    MIN_TERM_OVERLAP = 0.6  # share of a critical term's words that must appear on a page to attribute it there
+    MAX_TEMPLATES = 20_000  # oldest templates are evicted beyond this many
+    TTL_SECONDS = 30 * 24 * 60 * 60  # templates hold party details, so none is kept longer than this
+
+class PortfolioConstants:
+    OUTLIER_Z = 3.5  # robust (median/MAD) z-score above which a field is an outlier
+    MAX_Z = 99.0  # caps scores against a portfolio where every value is identical
+    MIN_PORTFOLIO_SIZE = 5  # fewer comparable agreements never flag outliers
+    TOP_K = 3  # anomalous fields sent to the model for an explanation
+
+class BatchConstants:
+    CHECKPOINT_DIR = "./jobs/batches"
+    COMPLETION_WINDOW = "24h"
+    POLL_INTERVAL = 30.0
+    MAX_ROUNDS = 3  # failed requests are resubmitted in a new batch until this many rounds have run
+    MAX_REQUESTS_PER_BATCH = 50_000
+    MAX_BATCH_BYTES = 190 * 1024 * 1024  # stays under the provider's 200 MB input file limit
+
+class OpenAIConstants:
+    MODEL = "gpt-4o-mini"
+    TEMPERATURE = 0.0125
+    MAX_TOKENS = 2000
+    FREQUENCY_PENALTY = 0.007
+    PRESENCE_PENALTY = 0.007
+
+class CacheConstants:
+    EXTRACTION_CACHE_DIR = "./cache/extractions"
+    MEMORY_MAX_ENTRIES = 128
+    DISK_MAX_BYTES = 256 * 1024 * 1024
+    DISK_TTL_SECONDS = 7 * 24 * 60 * 60
+    COMPARISON_SESSION_MAX_ENTRIES = 8
+    COMPARISON_PROCESS_MAX_ENTRIES = 256
+
+class ComparisonConstants:
+    MAX_CRITICAL_TERMS = 15  # per document, sent as context for the fields the model compares
+    MAX_TERM_DETAIL_CHARS = 300
+
+class PageRenderConstants:
+    MIN_TEXT_CHARS = 200
+    MIN_TEXT_QUALITY = 0.85
+    TEXT_PAGE_IMAGE = "skip"  # "skip" or "low"
+    DPI = 150
+    JPEG_QUALITY = 70
+    GRAYSCALE = True
+    CROP_MARGINS = True
+    CROP_THRESHOLD = 24
+    CROP_PADDING = 12
+    MAX_IMAGE_SIDE = 2048
+    LOW_DETAIL_SIDE = 512
+    MIN_PAGES_FOR_POOL = 8
+    # gpt-4o-mini image pricing in tokens
+    IMAGE_BASE_TOKENS = 2833
+    IMAGE_TILE_TOKENS = 5667
+
+class PayloadConstants:
+    MAX_REQUEST_BYTES = 32 * 1024 * 1024  # images are dropped or downscaled to fit, otherwise the request is refused
+    STREAM_CHUNK_BYTES = 64 * 1024  # request bodies are sent in pieces of about this size
+    BODY_OVERHEAD_BYTES = 64 * 1024  # reserved for the schema, parameters and JSON escaping when fitting images
+
+class LLMClientConstants:
+    REQUEST_TIMEOUT = 120.0
+    CONNECT_TIMEOUT = 10.0
+    MAX_CONNECTIONS = 20
+    MAX_KEEPALIVE_CONNECTIONS = 10
+    KEEPALIVE_EXPIRY = 60.0
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 30.0
+    REQUESTS_PER_MINUTE = 500
+    TOKENS_PER_MINUTE = 2_000_000
+
+class ApiConstants:
+    JOB_DB_PATH = "./jobs/jobs.sqlite3"
+    WORKERS = 4
+    MAX_QUEUE_SIZE = 100
+    MAX_WAIT_SECONDS = 60
+    MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+    MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Allowance for form boundaries and headers around an upload
+    UPLOAD_CHUNK_BYTES = 1024 * 1024
+    RETRY_AFTER_SECONDS = 5
+    JOB_RETENTION_SECONDS = 24 * 60 * 60  # finished jobs and their results are deleted after this
+    PURGE_INTERVAL_SECONDS = 15 * 60
+
+class DocxConstants:
+    PAGE_CHARS = 3000  # native DOCX text is split into pseudo-pages of about this size
+    LIBREOFFICE_WORKERS = 2
+    LIBREOFFICE_PROFILE_DIR = "./cache/libreoffice"
+    CONVERSION_CACHE_DIR = "./cache/conversions"
+    CONVERSION_MAX_BYTES = 512 * 1024 * 1024
+    CONVERSION_TIMEOUT = 120
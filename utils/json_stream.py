@@ -0,0 +1,112 @@
+import json
+from typing import List, NamedTuple, Optional
+
+_WHITESPACE = " \t\r\n"
+
+
+class JSONStreamEvent(NamedTuple):
+    """A top-level member (``kind="field"``) or top-level array element (``kind="item"``) that has closed."""
+    kind: str
+    key: str
+    value: object
+    index: Optional[int] = None
+
+
+class IncrementalJSONParser:
+    """Parse a streamed JSON object and report members as soon as they are complete.
+
+    Text is fed in arbitrary chunks. Each top-level member of the object is
+    reported once its value closes, and the elements of top-level arrays are
+    reported one by one as they close, before the array itself is finished.
+    Only completed slices are handed to ``json.loads``, so nothing partial is
+    ever reported.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._position = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._expect = "object"
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._item_start = None
+        self._item_index = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List[JSONStreamEvent]:
+        """Consume more text and return the members completed by it, in order."""
+        events = []
+        for char in chunk:
+            self._buffer.append(char)
+            self._consume(char, self._position, events)
+            self._position += 1
+        return events
+
+    def _text(self, start: int, stop: int) -> str:
+        return "".join(self._buffer[start:stop])
+
+    def _consume(self, char: str, index: int, events: List[JSONStreamEvent]):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if len(self._stack) == 1 and self._expect == "key":
+                    self._key = json.loads(self._text(self._key_start, index + 1))
+                    self._expect = "colon"
+            return
+        if char in _WHITESPACE or self.done:
+            return
+
+        depth = len(self._stack)
+        if char not in ",:}]":
+            self._mark_start(char, index, depth)
+
+        if char in "{[":
+            self._stack.append(char)
+        elif char in "}]":
+            if depth == 2 and self._stack[-1] == "[" and self._item_start is not None:
+                self._emit_item(index, events)
+            if depth == 1:
+                self._emit_field(index, events)
+                self.done = True
+            self._stack.pop()
+        elif char == ",":
+            if depth == 1:
+                self._emit_field(index, events)
+            elif depth == 2 and self._stack[-1] == "[":
+                self._emit_item(index, events)
+        elif char == ":" and depth == 1:
+            self._expect = "value"
+        elif char == '"':
+            self._in_string = True
+
+    def _mark_start(self, char: str, index: int, depth: int):
+        """Remember where a key, a top-level value or a top-level array element begins."""
+        if depth == 0 and char == "{":
+            self._expect = "key"
+        elif depth == 1 and self._expect == "key" and char == '"':
+            self._key_start = index
+        elif depth == 1 and self._expect == "value" and self._value_start is None:
+            self._value_start = index
+            self._item_index = 0
+        elif depth == 2 and self._stack[-1] == "[" and self._item_start is None:
+            self._item_start = index
+
+    def _emit_item(self, index: int, events: List[JSONStreamEvent]):
+        value = json.loads(self._text(self._item_start, index))
+        events.append(JSONStreamEvent("item", self._key, value, self._item_index))
+        self._item_index += 1
+        self._item_start = None
+
+    def _emit_field(self, index: int, events: List[JSONStreamEvent]):
+        if self._value_start is not None:
+            events.append(JSONStreamEvent("field", self._key, json.loads(self._text(self._value_start, index))))
+        self._value_start = None
+        self._key = None
+        self._expect = "key"
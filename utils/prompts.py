@@ -28,6 +28,13 @@ class RentalAgreement(BaseModel):
         description="Flag any and all critical terms exclusively that NOT extracted already in the schema but deemed significant (e.g., clauses on property damage, maintenance, subletting, etc.). Empty list if not found."
     )
 
+class PartialRentalAgreement(RentalAgreement):
+    """
+    Defines the schema for extracting one window of pages of a long rental agreement, where a field may not appear,
+    and for validating the merged agreement, where "" marks a field no window states.
+    """
+    UtilitiesResponsibility: Literal["Tenant", "Owner", ""] = Field(..., description="Who bears the cost of utilities, or \"\" if these pages do not say")
+
 class ComparisonReportEntry(BaseModel):
     """
     Represents a single comparison entry between two rental agreement terms.
@@ -54,6 +61,40 @@ class ComparisonReport(BaseModel):
         populate_by_name = True
 
 
+class ReconciledField(BaseModel):
+    """
+    Represents the single value chosen for a field whose partial extractions disagree.
+    """
+    FieldName: str = Field(..., alias="Field", description="The field name exactly as given (e.g., RentalAmount)")
+    Value: str = Field(..., description="The value that applies to the agreement as a whole")
+
+    class Config:
+        populate_by_name = True
+
+
+class ReconciledFields(BaseModel):
+    """
+    Represents the resolution of all conflicting fields of a chunked extraction.
+    """
+    Fields: List[ReconciledField] = Field(..., description="One entry per conflicting field")
+
+
+class PortfolioFieldExplanation(BaseModel):
+    """
+    Represents the explanation of one field where an agreement deviates from the portfolio.
+    """
+    Feature: str = Field(..., description="The feature name exactly as given (e.g., MonthlyRent)")
+    Explanation: str = Field(..., description="Why the value stands out against the portfolio")
+    Inference: str = Field(..., description="The legal, financial or practical consequences of the deviation")
+
+
+class PortfolioExplanation(BaseModel):
+    """
+    Represents the explanations of the most anomalous fields of an agreement against the portfolio.
+    """
+    Explanations: List[PortfolioFieldExplanation] = Field(..., description="One entry per anomalous feature")
+
+
 EXTRACT_FORMAT="""
 Return a JSON Response for else the code will FAIL!!!:
 
@@ -124,4 +165,38 @@ For each Field or Term in data dictionary for each document(except Critical Term
 }
 compare all terms EXCEPT "Critical Terms"!!!
 return JSON
-"""
\ No newline at end of file
+"""
+
+PARTIAL_COMPARE_NOTE= """
+NOTE : All other fields were already found identical and are NOT included.
+Compare ONLY the fields present in the given document data and return exactly one entry per field!!
+"CriticalTerms" is given only as context for interpreting those fields; do NOT return entries for it.
+"""
+
+PARTIAL_EXTRACT_NOTE= """
+NOTE : This is ONLY pages {first_page} to {last_page} of a {page_count} page agreement.
+Extract only what appears in these pages. Use an empty string "" for any field NOT present in these pages, do NOT guess!!
+"""
+
+TEMPLATE_EXTRACT_NOTE= """
+NOTE : This agreement follows a known template. Only pages {pages} of {page_count} differ from the template and are given here; all other pages are identical to it.
+The template's extraction is: {template}
+Return the extraction for the WHOLE agreement: take each value from the given pages where it appears there, otherwise keep the template's value.
+List ONLY the critical terms found in the given pages!!
+"""
+
+RECONCILE_FORMAT= """
+A long rental agreement was extracted in parts and the parts disagree on some fields.
+For each field below you are given the candidate values with the pages they were found on.
+Pick (or combine) the value that applies to the agreement as a whole, considering that later amendments or specific clauses override general ones.
+Return one entry per field with "Field" exactly as given and the final "Value".
+return JSON
+"""
+
+PORTFOLIO_EXPLAIN_FORMAT= """
+A new rental agreement was compared against a portfolio of existing agreements and some of its terms stand out.
+You are given the new agreement and, for each anomalous feature, its value, the portfolio median, the deviation in percent, the robust z-score and the percentile rank.
+For each feature explain briefly why it stands out and its implications, using the agreement's clauses (including Critical Terms) where they justify the deviation.
+Return one entry per feature with "Feature" exactly as given.
+return JSON
+"""
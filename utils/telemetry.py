@@ -0,0 +1,208 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+logger = logging.getLogger("telemetry")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+# Identifies the document being processed, so events can be attributed to it.
+current_document = contextvars.ContextVar("current_document", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsSink:
+    """Sink that aggregates telemetry events into counters and histograms."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = set()
+        self._lock = threading.Lock()
+
+    def handle(self, event: dict):
+        with self._lock:
+            if event["type"] == "span":
+                self._observe("stage_duration_seconds", {"stage": event["name"]}, event["duration_seconds"], DURATION_BUCKETS)
+            elif event["type"] == "llm_call":
+                labels = {"operation": event["operation"]}
+                self._increment("llm_requests_total", labels, 1)
+                for field in ("prompt_tokens", "completion_tokens", "image_tokens", "payload_bytes"):
+                    self._increment(f"llm_{field}_total", labels, event[field])
+                self._observe("llm_request_duration_seconds", labels, event["duration_seconds"], DURATION_BUCKETS)
+                self._observe("llm_payload_bytes", labels, event["payload_bytes"], BYTES_BUCKETS)
+            elif event["type"] == "counter":
+                self._increment(event["name"], event["labels"], event["value"])
+            elif event["type"] == "gauge":
+                self.gauges.add(event["name"])
+                self.counters[(event["name"], self._key(event["labels"]))] = event["value"]
+
+    def counter(self, name: str, **labels) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        return self.counters.get((name, self._key(labels)), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        """Return a histogram, or None if nothing was observed."""
+        return self.histograms.get((name, self._key(labels)))
+
+    @staticmethod
+    def _key(labels: dict) -> tuple:
+        return tuple(sorted(labels.items()))
+
+    def _increment(self, name: str, labels: dict, value: float):
+        key = (name, self._key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def _observe(self, name: str, labels: dict, value: float, buckets: tuple):
+        key = (name, self._key(labels))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+
+
+class InMemorySink(MetricsSink):
+    """Keeps every raw event as well as the aggregates; intended for tests."""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def handle(self, event: dict):
+        super().handle(event)
+        with self._lock:
+            self.events.append(event)
+
+
+class PrometheusSink(MetricsSink):
+    """Aggregates events and renders them in the Prometheus text exposition format."""
+
+    NAMESPACE = "rent_agreement"
+
+    def render(self) -> str:
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"{self.NAMESPACE}_{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} {'gauge' if name in self.gauges else 'counter'}")
+                lines.append(f"{metric}{self._format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                metric = f"{self.NAMESPACE}_{name}"
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{self._format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{self._format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{self._format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+            for key, value in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+
+class JsonLogSink:
+    """Writes each event as one JSON log line."""
+
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def handle(self, event: dict):
+        logger.log(self.level, json.dumps(event, default=str))
+
+
+class Telemetry:
+    """Records timing spans and LLM usage and fans the events out to pluggable sinks."""
+
+    def __init__(self, sinks: Optional[List] = None):
+        self.sinks = list(sinks) if sinks is not None else [JsonLogSink(), PrometheusSink()]
+
+    def emit(self, event: dict):
+        event.setdefault("timestamp", time.time())
+        document = current_document.get()
+        if document:
+            event.setdefault("document", document)
+        for sink in self.sinks:
+            try:
+                sink.handle(event)
+            except Exception as e:
+                logger.error(f"Telemetry sink {sink.__class__.__name__} failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Time the enclosed block and emit a span event, marking failures."""
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record_span(name, time.perf_counter() - started, status, **labels)
+
+    def record_span(self, name: str, duration_seconds: float, status: str = "ok", **labels):
+        """Emit a span event for a duration measured by the caller."""
+        self.emit({
+            "type": "span",
+            "name": name,
+            "status": status,
+            "duration_seconds": duration_seconds,
+            "labels": labels,
+        })
+
+    def increment(self, name: str, value: float = 1, **labels):
+        self.emit({"type": "counter", "name": name, "value": value, "labels": labels})
+
+    def gauge(self, name: str, value: float, **labels):
+        self.emit({"type": "gauge", "name": name, "value": value, "labels": labels})
+
+    def record_llm_call(self, operation: str, duration_seconds: float, prompt_tokens: int,
+                        completion_tokens: int, image_tokens: int, payload_bytes: int):
+        """Record token usage, estimated image tokens and payload size for one API call."""
+        self.emit({
+            "type": "llm_call",
+            "operation": operation,
+            "duration_seconds": duration_seconds,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "image_tokens": image_tokens,
+            "payload_bytes": payload_bytes,
+        })
+
+    def prometheus_text(self) -> str:
+        """Render metrics from the first PrometheusSink, or an empty document."""
+        for sink in self.sinks:
+            if isinstance(sink, PrometheusSink):
+                return sink.render()
+        return ""
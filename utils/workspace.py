@@ -0,0 +1,225 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from uuid import uuid4
+
+from utils.constants import WorkspaceConstants
+
+logger = logging.getLogger(__name__)
+
+# Folders currently handed out by any manager in this process; never evicted.
+_active_folders = set()
+_active_lock = threading.Lock()
+
+
+class WorkspaceQuotaError(Exception):
+    """Raised when a write would exceed the workspace quota even after eviction."""
+
+
+def folder_size(path: str) -> int:
+    """Return the total size in bytes of the files under ``path``."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class WorkspaceManager:
+    """Bounded scratch space: UUID folders under ``base_dir`` with a disk quota and TTL.
+
+    Folders handed out by ``scratch()`` are removed when the block exits, even on
+    error. Folders left behind by crashed or killed processes are reclaimed by a
+    background janitor once older than ``ttl_seconds``, and the oldest idle
+    folders are evicted first whenever the workspace exceeds ``quota_bytes``.
+    """
+
+    def __init__(self, base_dir: str, quota_bytes: int = WorkspaceConstants.QUOTA_BYTES,
+                 ttl_seconds: float = WorkspaceConstants.TTL_SECONDS,
+                 grace_seconds: float = WorkspaceConstants.EVICTION_GRACE_SECONDS, telemetry=None):
+        self.base_dir = os.path.abspath(base_dir)
+        self.name = os.path.basename(self.base_dir)
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.grace_seconds = grace_seconds
+        self.telemetry = telemetry
+        self._lock = threading.Lock()
+        self._evicted = 0
+        self._expired = 0
+        os.makedirs(self.base_dir, exist_ok=True)
+
+    def create(self) -> str:
+        """Create a new scratch folder; the caller must ``release`` it."""
+        folder_path = os.path.join(self.base_dir, str(uuid4()))
+        os.makedirs(folder_path)
+        with _active_lock:
+            _active_folders.add(folder_path)
+        return folder_path
+
+    def release(self, folder_path: str):
+        """Delete a scratch folder and its contents."""
+        with _active_lock:
+            _active_folders.discard(os.path.abspath(folder_path))
+        self._remove(folder_path)
+        self._publish()
+
+    @contextmanager
+    def scratch(self):
+        """Yield a scratch folder that is always removed when the block exits."""
+        folder_path = self.create()
+        try:
+            yield folder_path
+        finally:
+            self.release(folder_path)
+
+    def save_file(self, folder_path: str, filename: str, data: bytes) -> str:
+        """Write ``data`` into a scratch folder, evicting idle folders to stay within the quota."""
+        with self._lock:
+            if self._usage()[0] + len(data) > self.quota_bytes:
+                self._evict(len(data))
+                if self._usage()[0] + len(data) > self.quota_bytes:
+                    raise WorkspaceQuotaError(
+                        f"Workspace {self.name} is full ({self.quota_bytes} bytes); cannot store {filename}."
+                    )
+        file_path = os.path.join(folder_path, filename)
+        with open(file_path, "wb") as file:
+            file.write(data)
+        self._publish()
+        return file_path
+
+    def sweep(self):
+        """Remove idle folders older than the TTL, then enforce the quota."""
+        now = time.time()
+        with self._lock:
+            for folder_path, modified, _ in self._folders():
+                if now - modified > self.ttl_seconds and not self._is_active(folder_path):
+                    logger.info(f"Removing expired workspace folder: {folder_path}")
+                    self._remove(folder_path)
+                    self._expired += 1
+            self._evict(0)
+        self._publish()
+
+    def stats(self) -> dict:
+        bytes_in_use, folders = self._usage()
+        with _active_lock:
+            active = sum(1 for path in _active_folders if os.path.dirname(path) == self.base_dir)
+        return {
+            "bytes_in_use": bytes_in_use,
+            "quota_bytes": self.quota_bytes,
+            "folders": folders,
+            "active_folders": active,
+            "evicted": self._evicted,
+            "expired": self._expired,
+        }
+
+    def _folders(self) -> list:
+        """Return ``(path, mtime, size)`` for every folder, oldest first."""
+        entries = []
+        try:
+            names = os.listdir(self.base_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            path = os.path.join(self.base_dir, name)
+            try:
+                if os.path.isdir(path):
+                    entries.append((path, os.path.getmtime(path), folder_size(path)))
+            except OSError:
+                continue
+        entries.sort(key=lambda entry: entry[1])
+        return entries
+
+    def _usage(self) -> tuple:
+        folders = self._folders()
+        return sum(size for _, _, size in folders), len(folders)
+
+    def _evict(self, incoming_bytes: int):
+        """Delete idle folders, oldest first, until ``incoming_bytes`` fits in the quota."""
+        folders = self._folders()
+        total = sum(size for _, _, size in folders)
+        now = time.time()
+        for folder_path, modified, size in folders:
+            if total + incoming_bytes <= self.quota_bytes:
+                break
+            # Recent folders may belong to another process that is still writing them.
+            if self._is_active(folder_path) or now - modified < self.grace_seconds:
+                continue
+            logger.warning(f"Workspace {self.name} over quota; evicting {folder_path}")
+            self._remove(folder_path)
+            self._evicted += 1
+            total -= size
+
+    def _publish(self):
+        if self.telemetry is not None:
+            self.telemetry.gauge("workspace_bytes_in_use", self._usage()[0], workspace=self.name)
+
+    @staticmethod
+    def _is_active(folder_path: str) -> bool:
+        with _active_lock:
+            return folder_path in _active_folders
+
+    @staticmethod
+    def _remove(folder_path: str):
+        try:
+            shutil.rmtree(folder_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to delete workspace folder {folder_path}: {e}")
+
+
+class Janitor:
+    """Daemon thread that sweeps every registered workspace on a schedule."""
+
+    def __init__(self, interval_seconds: float = WorkspaceConstants.JANITOR_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._workspaces = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def register(self, workspace: WorkspaceManager):
+        """Sweep ``workspace`` now and on every following interval."""
+        with self._lock:
+            self._workspaces.add(workspace)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="workspace-janitor", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            with self._lock:
+                workspaces = list(self._workspaces)
+            for workspace in workspaces:
+                try:
+                    workspace.sweep()
+                except Exception as e:
+                    logger.error(f"Workspace sweep failed for {workspace.base_dir}: {e}")
+
+
+janitor = Janitor()
+_workspaces = {}
+_workspaces_lock = threading.Lock()
+
+
+def get_workspace(base_dir: str, telemetry=None) -> WorkspaceManager:
+    """Return the process-wide workspace for ``base_dir``, starting its janitor on first use."""
+    key = os.path.abspath(base_dir)
+    with _workspaces_lock:
+        workspace = _workspaces.get(key)
+        if workspace is None:
+            workspace = _workspaces[key] = WorkspaceManager(base_dir)
+            janitor.register(workspace)
+        if telemetry is not None:
+            workspace.telemetry = telemetry
+    return workspace